@@ -0,0 +1,88 @@
+"""
+Zip archive of a generated project, built in memory straight from its output tree.
+
+Archives are reproducible: entries are sorted and carry a fixed timestamp and
+permissions, so the same tree always zips to the same bytes and the archive hash
+can be used as an ETag.
+"""
+
+import base64
+import hashlib
+import io
+import zipfile
+
+import settings
+
+# earliest date a zip entry can carry
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = 0o100644
+
+
+def build_zip(tree, compresslevel=None):
+    """
+    zips every file of the tree into an in-memory buffer
+    :param tree:
+    :param compresslevel: 0 (stored) to 9, settings.ZIP_COMPRESSLEVEL if not given
+    :return: io.BytesIO holding the archive
+    """
+    if compresslevel is None:
+        compresslevel = settings.ZIP_COMPRESSLEVEL
+    compression = zipfile.ZIP_STORED if compresslevel == 0 else zipfile.ZIP_DEFLATED
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(
+        buffer, "w", compression=compression, compresslevel=compresslevel
+    ) as zip_file:
+        for path, content in tree.items():
+            info = zipfile.ZipInfo(path, date_time=ZIP_DATE_TIME)
+            info.compress_type = compression
+            info.create_system = 3
+            info.external_attr = ZIP_FILE_MODE << 16
+            zip_file.writestr(info, content, compresslevel=compresslevel)
+    return buffer
+
+
+def archive_etag(buffer):
+    """
+    returns quoted sha256 of the archive in buffer
+    """
+    with buffer.getbuffer() as archive:
+        return f'"{hashlib.sha256(archive).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    whether an If-None-Match header value matches etag
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def encode_archive(buffer):
+    """
+    returns the archive in buffer base64 encoded, without line breaks, and closes it
+    """
+    # encode straight from the buffer, getvalue() would copy the whole archive
+    with buffer.getbuffer() as archive:
+        encoded = base64.b64encode(archive)
+    buffer.close()
+    return encoded
+
+
+def encode_zip(tree, compresslevel=None):
+    """
+    returns the zipped tree base64 encoded, without line breaks
+    :param tree:
+    :param compresslevel:
+    :return: bytes
+    """
+    return encode_archive(build_zip(tree, compresslevel))
@@ -0,0 +1,140 @@
+"""
+Stores for bundles returned by reference instead of inline.
+
+With output_mode "reference" the zipped project is put into an artifact store
+under the digest of its content and only the key and size are returned, which
+keeps large environments below the lambda response limit. Identical projects map
+to the same key, so they are stored once.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+import settings
+from archive import build_zip
+from exceptions import ArtifactStoreError
+
+
+class LocalDirectoryStore:
+    def __init__(self, root):
+        self.root = root
+
+    def size(self, key):
+        """
+        returns size of the stored object, None if there is no object under key
+        """
+        path = os.path.join(self.root, key)
+        if not os.path.isfile(path):
+            return None
+        return os.path.getsize(path)
+
+    def put(self, key, fileobj):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write next to the final path so readers never see a partial object
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".put-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            os.unlink(tmp_path)
+            raise ArtifactStoreError(f"Failed to store {key}: {e}")
+
+    def get(self, key):
+        with open(os.path.join(self.root, key), "rb") as f:
+            return f.read()
+
+
+class S3Store:
+    def __init__(self, bucket, prefix="", client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            # boto3 ships with the lambda runtime, it's only needed for this store
+            import boto3
+
+            self._client = boto3.client("s3")
+        return self._client
+
+    def size(self, key):
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            error = getattr(e, "response", {}).get("Error", {})
+            if error.get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise ArtifactStoreError(f"Failed to look up {key}: {e}")
+        return response["ContentLength"]
+
+    def put(self, key, fileobj):
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=fileobj)
+        except Exception as e:
+            raise ArtifactStoreError(f"Failed to store {key}: {e}")
+
+    def get(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        return response["Body"].read()
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+
+def store_from_url(url):
+    """
+    s3://bucket/prefix for S3Store, a local path or file:// url for LocalDirectoryStore
+    :param url:
+    :return:
+    """
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://") :].partition("/")
+        return S3Store(bucket, prefix)
+    if url.startswith("file://"):
+        url = url[len("file://") :]
+    return LocalDirectoryStore(url)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    url = settings.ARTIFACT_STORE_URL
+    if not url:
+        raise ArtifactStoreError(
+            "output_mode 'reference' requires TROWEL_ARTIFACT_STORE to be configured."
+        )
+    with _stores_lock:
+        if url not in _stores:
+            _stores[url] = store_from_url(url)
+        return _stores[url]
+
+
+def store_bundle(tree, compresslevel=None, store=None):
+    """
+    zips the tree into the artifact store unless it's already there
+    :param tree:
+    :param compresslevel:
+    :param store: settings.ARTIFACT_STORE_URL store if not given
+    :return: key, size and whether an existing object was reused
+    """
+    store = store or get_store()
+    key = f"bundles/{tree.digest()}.zip"
+
+    size = store.size(key)
+    if size is not None:
+        return {"key": key, "size": size, "deduplicated": True}
+
+    buffer = build_zip(tree, compresslevel)
+    size = buffer.tell()
+    buffer.seek(0)
+    store.put(key, buffer)
+    buffer.close()
+    return {"key": key, "size": size, "deduplicated": False}
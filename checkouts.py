@@ -0,0 +1,59 @@
+"""
+Per-request registry of module checkouts.
+
+Many blocks of one bundle usually target the same module (a dozen containers on
+target-ecs-module@dev is common), every distinct module source (repo@ref, local
+directory...) is read once per request and all blocks render from that single
+in-memory snapshot.
+"""
+
+import threading
+
+import module_cache
+
+
+class ModuleCheckouts:
+    def __init__(self, cache=None):
+        self.cache = cache or module_cache.MODULE_CACHE
+        self.shas = {}
+        self._checkouts = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def resolve(self, source):
+        """
+        returns revision (commit sha for git) the module source points to, resolved
+        once per request
+        :param source: sources.GitSource, DirectorySource...
+        :return:
+        """
+        key = source.key
+        with self._key_lock(key):
+            if key not in self.shas:
+                self.shas[key] = source.resolve()
+            return self.shas[key]
+
+    def get(self, source):
+        """
+        returns top level files of the module source, fetching them on first use.
+        The returned dict is shared between blocks and must not be modified.
+        :param source:
+        :return: dict of file name -> bytes
+        """
+        key = source.key
+        with self._key_lock(key):
+            if key not in self._checkouts:
+                self.shas[key], self._checkouts[key] = source.read(
+                    self.shas.get(key), self.cache
+                )
+            return self._checkouts[key]
+
+    def close(self):
+        self._checkouts.clear()
+
+    def __len__(self):
+        return len(self._checkouts)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
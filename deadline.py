@@ -0,0 +1,192 @@
+"""
+Time budget of the current request.
+
+A lambda invocation is killed when its timeout runs out, mid clone and without a
+response. start() takes the remaining time from the invocation context (or
+settings.REQUEST_BUDGET_SECONDS in server mode) and every subprocess is bounded by
+what is left of it, minus settings.DEADLINE_MARGIN_SECONDS kept for returning the
+error. Running out raises DeadlineExceeded, which the handler turns into a 504.
+
+The deadline lives in a contextvar, worker threads started with
+contextvars.copy_context() share it.
+"""
+
+import contextlib
+import contextvars
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import settings
+from exceptions import DeadlineExceeded
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+# how often a running subprocess is checked for cancellation
+POLL_SECONDS = 0.05
+
+
+def budget(context=None):
+    """
+    returns seconds the request may take, None if it's unbounded
+    :param context: lambda context, None in server mode
+    """
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        return context.get_remaining_time_in_millis() / 1000
+    return settings.REQUEST_BUDGET_SECONDS or None
+
+
+def start(context=None):
+    """
+    starts the deadline of the current request
+    :return: seconds until the deadline, None if there is none
+    """
+    seconds = budget(context)
+    if seconds is None:
+        _deadline.set(None)
+        return None
+    seconds -= settings.DEADLINE_MARGIN_SECONDS
+    _deadline.set(time.monotonic() + seconds)
+    return seconds
+
+
+def remaining():
+    """
+    returns seconds left until the deadline, None if there is none
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def has(seconds):
+    """
+    returns whether at least seconds are left
+    """
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def check(stage):
+    """
+    raises DeadlineExceeded if the deadline passed, call before starting stage
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Request deadline exceeded before {stage}")
+
+
+def timeout(seconds=None):
+    """
+    returns timeout for something that may take up to seconds, capped by the
+    time left. None if neither is bounded
+    """
+    check("starting a subprocess")
+    left = remaining()
+    if left is None:
+        return seconds
+    return left if seconds is None else min(seconds, left)
+
+
+def run(args, cwd=None, input=None, env=None, timeout_seconds=None, cancel=None):
+    """
+    subprocess.run(args, check=True, capture_output=True) bounded by timeout_seconds
+    and the deadline
+    :param cancel: threading.Event, the process is killed when it's set
+    :raises DeadlineExceeded: the deadline passed while the process ran
+    :raises subprocess.TimeoutExpired: timeout_seconds passed or cancel was set
+    """
+    seconds = timeout(timeout_seconds)
+    ends = None if seconds is None else time.monotonic() + seconds
+    proc = subprocess.Popen(
+        args,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    with proc:
+        while True:
+            try:
+                stdout, stderr = proc.communicate(input, timeout=POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                # communicate keeps writing what's left of input, it may only be
+                # passed on the first call
+                input = None
+                cancelled = cancel is not None and cancel.is_set()
+                if not cancelled and (ends is None or time.monotonic() < ends):
+                    continue
+                proc.kill()
+                proc.communicate()
+                left = remaining()
+                if not cancelled and left is not None and left <= 0:
+                    raise DeadlineExceeded(
+                        f"Request deadline exceeded while running {args[0]}"
+                    )
+                raise subprocess.TimeoutExpired(args, seconds)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args, stdout, stderr)
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+
+
+@contextlib.contextmanager
+def reserve(seconds):
+    """
+    holds back seconds of the time left while the block runs, its subprocesses hit
+    the deadline that much earlier and leave the time to a fallback
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        yield
+        return
+    token = _deadline.set(deadline - seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def hedged(attempt, attempts, hedge_after):
+    """
+    runs attempt(cancel) and starts another one every hedge_after seconds while none
+    of them finished, or right away when one stalls (raises TimeoutExpired), as long
+    as time is left. Returns the result of the first one to succeed, the others are
+    cancelled.
+    :param attempt: function of a threading.Event, set when the attempt should stop
+    :param attempts: maximum number of attempts
+    :param hedge_after: seconds to wait for an attempt before starting the next one
+    """
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=attempts, thread_name_prefix="hedged")
+    pending = set()
+    started = 0
+    stalled = None
+    try:
+        while True:
+            if started < attempts and (started == 0 or has(hedge_after)):
+                if started:
+                    logger.warning("attempt %s stalled, starting another", started)
+                context = contextvars.copy_context()
+                pending.add(pool.submit(context.run, attempt, cancel))
+                started += 1
+            if not pending:
+                check("retrying")
+                raise stalled
+            wait_for = hedge_after if started < attempts else None
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except subprocess.TimeoutExpired as e:
+                    stalled = e
+    finally:
+        cancel.set()
+        # cancelled attempts kill their subprocess within POLL_SECONDS
+        pool.shutdown(wait=True)
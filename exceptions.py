@@ -14,6 +14,22 @@ class GitHubError(LambdaError):
 class TerraformFormatError(LambdaError):
     pass
 
+
+class HclFormatError(TerraformFormatError):
+    pass
+
+
 class ValidationError(LambdaError):
     pass
 
+
+class ArtifactStoreError(LambdaError):
+    pass
+
+
+class RefNotFoundError(GitHubError):
+    pass
+
+
+class DeadlineExceeded(LambdaError):
+    pass
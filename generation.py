@@ -0,0 +1,28 @@
+"""
+State shared by everything that runs as part of generating one terraform project.
+"""
+
+from checkouts import ModuleCheckouts
+from output_tree import OutputTree
+from timing import Timings
+
+
+class GenerationContext:
+    def __init__(self, checkouts=None, timings=None):
+        # an empty ModuleCheckouts is falsy, it has a __len__
+        self.checkouts = checkouts if checkouts is not None else ModuleCheckouts()
+        self.tree = OutputTree()
+        self.timings = timings or Timings()
+        # names of blocks rendered from scratch, the rest came from the render cache
+        self.rebuilt_blocks = []
+        self._owns_checkouts = checkouts is None
+
+    def close(self):
+        if self._owns_checkouts:
+            self.checkouts.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,42 +1,205 @@
 import json
-import tempfile
-import traceback
 
-from exceptions import PayloadValidationException, LambdaError
-from payloads import PayloadGenerateTerraform, validate_payload
-from utils import generate_terraform_project
+import deadline
+import logs
+import settings
+from exceptions import DeadlineExceeded, PayloadValidationException, LambdaError
+from timing import Timings
+
+# payloads (pydantic) and utils (jinja and the whole generator) are imported on
+# first use, keep module level imports of this file light for cold starts
+logger = logs.get_logger(__name__)
+
+
+def from_function_url(event):
+    """
+    returns whether event came through a function URL (or API gateway), those only
+    pass statusCode, headers and body of the response on
+    """
+    return "requestContext" in event
+
+
+def event_payload(event):
+    """
+    returns the payload of an event: the json body of a function URL (or server)
+    invocation, the event itself for a direct invocation
+    :raises PayloadValidationException: body isn't a json object
+    """
+    if "body" not in event:
+        return event
+    try:
+        payload = json.loads(event["body"])
+    except (TypeError, ValueError) as e:
+        raise PayloadValidationException(f"Request body is not valid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise PayloadValidationException("Request body must be a JSON object")
+    return payload
+
+
+# response keys a function URL passes on
+URL_RESPONSE_KEYS = ("statusCode", "headers", "body", "isBase64Encoded", "cookies")
+# small enough for a response header, the rest goes into the body
+URL_HEADER_KEYS = ("manifest_digest", "rebuilt_blocks")
+
+
+def url_response(result):
+    """
+    returns result of generate_terraform in a shape a function URL passes on:
+    manifest_digest and rebuilt_blocks go to X-Trowel-* headers, e.g.
+    X-Trowel-Manifest-Digest. When the result has other keys (delta, manifest,
+    timings, error) the body is a json object with them and the bundle under "body"
+    """
+    response = {k: v for k, v in result.items() if k in URL_RESPONSE_KEYS}
+    headers = dict(result.get("headers") or {})
+    for key in URL_HEADER_KEYS:
+        if key in result:
+            name = "X-Trowel-" + "-".join(part.capitalize() for part in key.split("_"))
+            value = result[key]
+            headers[name] = value if isinstance(value, str) else json.dumps(value)
+    response["headers"] = headers
+
+    body = response.get("body")
+    if isinstance(body, bytes):
+        body = body.decode()
+    extra = {
+        k: v
+        for k, v in result.items()
+        if k not in URL_RESPONSE_KEYS and k not in URL_HEADER_KEYS
+    }
+    # a 304 has no body
+    if extra and response["statusCode"] != 304:
+        if body is not None:
+            extra["body"] = body
+        headers["Content-Type"] = "application/json"
+        body = json.dumps(extra)
+    if body is not None:
+        response["body"] = body
+    return response
 
 
 def generate_terraform(event, context):
-    print(f"event: {event}, context: {context}")
-    use_temp_dir = True
+    result = _generate_terraform(event, context)
+    if from_function_url(event):
+        return url_response(result)
+    return result
+
 
+def _generate_terraform(event, context):
+    logs.start_request()
+    deadline.start(context)
+    logger.debug("event: %s, context: %s", logs.summarize(event), context)
+
+    try:
+        payload = event_payload(event)
+    except PayloadValidationException as err:
+        logger.warning("generate_terraform: invalid body: %s", err)
+        return {"statusCode": 400, "error": err.message}
     # check if event is coming from direct invocation or url invocation
     if "body" in event:
-        payload = json.loads(event["body"])
-    else:
-        payload = event
+        headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+        if "if-none-match" in headers:
+            payload["if_none_match"] = headers["if-none-match"]
+    logger.info(
+        "generate_terraform: id: %s, blocks: %s",
+        payload.get("id"),
+        len(payload.get("blocks") or []),
+    )
 
+    timings = Timings()
     try:
-        validate_payload(payload, PayloadGenerateTerraform)
+        with timings.span("validation"):
+            from payloads import PayloadGenerateTerraform, validate_payload
+
+            validate_payload(payload, PayloadGenerateTerraform)
     except PayloadValidationException as err:
-        print(f"generate_terraform: invalid payload: {err}")
+        logger.warning("generate_terraform: invalid payload: %s", err)
         return {"statusCode": 500, "error": err.message}
     except Exception as err:
-        print(traceback.format_exc())
-        print(f"generate_terraform: failed to validate payload: {err}")
+        logger.exception("generate_terraform: failed to validate payload: %s", err)
         return {"statusCode": 500, "error": str(err)}
 
     try:
-        if use_temp_dir:
-            with tempfile.TemporaryDirectory() as tmp_dir_name:
-                result = generate_terraform_project(tmp_dir_name, "", payload)
-                return result
+        from utils import generate_terraform_project
+
+        # generated in memory, only dumped to disk when debugging
+        return generate_terraform_project(
+            settings.OUTPUT_DUMP_DIR,
+            settings.TF_TEMPLATES_DIR,
+            payload,
+            timings=timings,
+        )
+    except DeadlineExceeded as de:
+        logger.error("generate_terraform: timed out: %s", de)
+        return {"statusCode": 504, "error": de.message}
+    except LambdaError as le:
+        logger.exception("generate_terraform: lambda error: %s", le)
+        return {"statusCode": 500, "error": le.message}
+    except Exception as e:
+        logger.exception("generate_terraform: exception: %s", e)
+        return {"statusCode": 500, "error": str(e)}
+
+
+def generate_terraform_batch(event, context):
+    """
+    generates several environments in one call, the event carries either
+    {"payloads": [payload, ...]} or {"base": payload, "environments": {name: overrides}},
+    see utils.generate_terraform_batch for the response
+    """
+    logs.start_request()
+    deadline.start(context)
+    try:
+        batch = event_payload(event)
+    except PayloadValidationException as err:
+        logger.warning("generate_terraform_batch: invalid body: %s", err)
+        return {"statusCode": 400, "error": err.message}
+
+    try:
+        from payloads import (
+            PayloadGenerateTerraform,
+            PayloadGenerateTerraformBatch,
+            batch_environments,
+            validate_payload,
+        )
+
+        validate_payload(batch, PayloadGenerateTerraformBatch)
+        environments = batch_environments(batch)
+        for name, payload in environments:
+            try:
+                validate_payload(payload, PayloadGenerateTerraform)
+            except PayloadValidationException as err:
+                raise PayloadValidationException(f"{name}: {err.message}")
+    except PayloadValidationException as err:
+        logger.warning("generate_terraform_batch: invalid payload: %s", err)
+        return {"statusCode": 500, "error": err.message}
+    except Exception as err:
+        logger.exception(
+            "generate_terraform_batch: failed to validate payload: %s", err
+        )
+        return {"statusCode": 500, "error": str(err)}
+
+    logger.info(
+        "generate_terraform_batch: environments: %s", [name for name, _ in environments]
+    )
+    try:
+        from utils import generate_terraform_batch as generate_batch
+
+        result = generate_batch(settings.TF_TEMPLATES_DIR, environments)
+        if from_function_url(event):
+            return {
+                "statusCode": result["statusCode"],
+                "headers": {"Content-Type": "application/json"},
+                # base64 encoded archives
+                "body": json.dumps(
+                    {"environments": result["environments"]}, default=bytes.decode
+                ),
+            }
+        return result
+    except DeadlineExceeded as de:
+        logger.error("generate_terraform_batch: timed out: %s", de)
+        return {"statusCode": 504, "error": de.message}
     except LambdaError as le:
-        print(traceback.format_exc())
-        print(f"generate_terraform: lambda error: {le}")
+        logger.exception("generate_terraform_batch: lambda error: %s", le)
         return {"statusCode": 500, "error": le.message}
     except Exception as e:
-        print(f"generate_terraform: exception: {traceback.format_exc()}")
+        logger.exception("generate_terraform_batch: exception: %s", e)
         return {"statusCode": 500, "error": str(e)}
-    return {"statusCode": 200, "body": json.dumps({})}
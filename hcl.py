@@ -1,5 +1,9 @@
 import re
 
+from logs import get_logger
+
+logger = get_logger(__name__)
+
 
 def convert_string_to_hcl(t):
     return str(t).replace("'", '"')
@@ -13,7 +17,7 @@ def replace_terraform_parameters(s: str):
     """
     matches = re.finditer(r'\"##(.*)##\"', s, re.MULTILINE)
     for matchNum, match in enumerate(matches, start=1):
-        print(f"++++++++++++++++   {match.group(0)}, {match.group(1)}")
+        logger.debug("replacing %s with %s", match.group(0), match.group(1))
         s = s.replace(match.group(0), match.group(1))
     return s
 
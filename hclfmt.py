@@ -0,0 +1,484 @@
+"""
+In-process formatter for the HCL our templates emit.
+
+Follows the rules `terraform fmt` (hclwrite) applies:
+    * two spaces of indentation per open bracket level
+    * one space between tokens, except around dots, before commas, inside brackets...
+    * `=` of consecutive single line attributes aligned, same for trailing comments
+    * interpolation-only attribute values unwrapped ("${var.x}" -> var.x) and legacy
+      variable types normalized ("string" -> string, list -> list(any))
+and additionally normalizes blank lines (trailing whitespace removed, runs of blank
+lines collapsed, exactly one newline at the end of the file).
+
+Input it doesn't understand (unterminated strings, multi-line block comments...)
+raises HclFormatError, callers fall back to the terraform binary.
+"""
+
+import re
+
+from exceptions import HclFormatError
+
+IDENT = "ident"
+NUMBER = "number"
+STRING = "string"
+HEREDOC = "heredoc"
+COMMENT = "comment"
+OPEN = "open"
+CLOSE = "close"
+OP = "op"
+OTHER = "other"
+
+# longest first, so "==" is not read as two "="
+OPERATORS = (
+    "...",
+    "==",
+    "!=",
+    "<=",
+    ">=",
+    "=>",
+    "&&",
+    "||",
+    "::",
+    "=",
+    "<",
+    ">",
+    "+",
+    "-",
+    "*",
+    "/",
+    "%",
+    "!",
+    "?",
+    ":",
+    ",",
+    ".",
+)
+
+IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+NUMBER_RE = re.compile(r"[0-9]+(\.[0-9]+)?([eE][+-]?[0-9]+)?")
+HEREDOC_RE = re.compile(r"<<-?([A-Za-z_][A-Za-z0-9_-]*)")
+
+# a minus right after one of these is a negation, not a subtraction
+NEGATION_CONTEXT = {
+    "(",
+    "{",
+    "[",
+    "=",
+    ":",
+    ",",
+    "?",
+    "+",
+    "-",
+    "*",
+    "/",
+    "%",
+    "==",
+    "!=",
+    ">",
+    ">=",
+    "<",
+    "<=",
+    "&&",
+    "||",
+    "!",
+}
+
+
+class Line:
+    def __init__(self, tokens=None, raw=None):
+        self.tokens = tokens or []
+        # heredoc bodies are kept exactly as they are
+        self.raw = raw
+
+
+def scan_string(source, start):
+    """
+    returns index right after the quoted string starting at source[start]
+    """
+    i = start + 1
+    while i < len(source):
+        c = source[i]
+        if c == "\\":
+            i += 2
+        elif c == '"':
+            return i + 1
+        elif c == "\n":
+            break
+        elif source.startswith(("$${", "%%{"), i):
+            i += 3
+        elif source.startswith(("${", "%{"), i):
+            i = scan_template(source, i + 2)
+        else:
+            i += 1
+    raise HclFormatError(f"Unterminated string at offset {start}")
+
+
+def scan_template(source, start):
+    """
+    returns index right after the "}" closing the template sequence opened before start
+    """
+    depth = 0
+    i = start
+    while i < len(source):
+        c = source[i]
+        if c == '"':
+            i = scan_string(source, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            if depth == 0:
+                return i + 1
+            depth -= 1
+        i += 1
+    raise HclFormatError(f"Unterminated template sequence at offset {start}")
+
+
+def tokenize(source):
+    lines = []
+    tokens = []
+    heredoc_markers = []
+    i = 0
+    while i < len(source):
+        c = source[i]
+
+        if c == "\n":
+            lines.append(Line(tokens))
+            tokens = []
+            i += 1
+            for marker in heredoc_markers:
+                while True:
+                    if i >= len(source):
+                        raise HclFormatError(f"Unterminated heredoc {marker}")
+                    end = source.find("\n", i)
+                    end = len(source) if end == -1 else end
+                    body_line = source[i:end]
+                    lines.append(Line(raw=body_line))
+                    i = end + 1
+                    if body_line.strip() == marker:
+                        break
+            heredoc_markers = []
+            continue
+
+        if c in " \t\r":
+            i += 1
+            continue
+
+        if c == "#" or source.startswith("//", i):
+            end = source.find("\n", i)
+            end = len(source) if end == -1 else end
+            tokens.append((COMMENT, source[i:end].rstrip()))
+            i = end
+            continue
+
+        if source.startswith("/*", i):
+            end = source.find("*/", i)
+            if end == -1 or "\n" in source[i:end]:
+                raise HclFormatError("Multi-line block comments are not supported")
+            tokens.append((COMMENT, source[i : end + 2]))
+            i = end + 2
+            continue
+
+        heredoc = HEREDOC_RE.match(source, i)
+        if heredoc:
+            tokens.append((HEREDOC, heredoc.group(0)))
+            heredoc_markers.append(heredoc.group(1))
+            i = heredoc.end()
+            continue
+
+        if c == '"':
+            end = scan_string(source, i)
+            tokens.append((STRING, source[i:end]))
+            i = end
+            continue
+
+        if c in "{[(":
+            tokens.append((OPEN, c))
+            i += 1
+            continue
+
+        if c in "}])":
+            tokens.append((CLOSE, c))
+            i += 1
+            continue
+
+        match = IDENT_RE.match(source, i) or NUMBER_RE.match(source, i)
+        if match:
+            kind = IDENT if match.re is IDENT_RE else NUMBER
+            tokens.append((kind, match.group(0)))
+            i = match.end()
+            continue
+
+        for op in OPERATORS:
+            if source.startswith(op, i):
+                tokens.append((OP, op))
+                i += len(op)
+                break
+        else:
+            tokens.append((OTHER, c))
+            i += 1
+
+    if heredoc_markers:
+        raise HclFormatError(f"Unterminated heredoc {heredoc_markers[0]}")
+    if tokens:
+        lines.append(Line(tokens))
+    return lines
+
+
+def bracket_change(tokens):
+    net = 0
+    for kind, _ in tokens:
+        if kind == OPEN:
+            net += 1
+        elif kind == CLOSE:
+            net -= 1
+        elif kind == HEREDOC:
+            break
+    return net
+
+
+def space_after(before, subject, after):
+    """
+    whether a space goes between subject and after, same rules as hclwrite
+    """
+    s_kind, s_text = subject
+    a_kind, a_text = after
+
+    if s_kind == IDENT and a_text == "(":
+        return False
+    if (s_kind == IDENT and a_text == "::") or (s_text == "::" and a_kind == IDENT):
+        return False
+    if s_text == "." or a_text == ".":
+        return False
+    if a_text in (",", "..."):
+        return False
+    if s_text == ",":
+        return True
+    if s_kind == HEREDOC:
+        return False
+    if s_text == "in" and before is not None and before[0] == IDENT:
+        return True
+    if a_text == "[" and (s_kind in (IDENT, NUMBER) or s_kind == CLOSE):
+        return False
+    if s_text == "-" and s_kind == OP:
+        return before is not None and before[1] not in NEGATION_CONTEXT
+    if s_text == "!" and s_kind == OP:
+        return False
+    if s_text == "{" or a_text == "}":
+        return not (s_text == "{" and a_text == "}")
+    if s_kind == OPEN:
+        return False
+    if a_kind == CLOSE:
+        return False
+    return True
+
+
+def join_tokens(tokens, before=None):
+    result = ""
+    for i, token in enumerate(tokens):
+        if i > 0:
+            previous = tokens[i - 2] if i > 1 else before
+            if space_after(previous, tokens[i - 1], token):
+                result += " "
+        result += token[1]
+    return result
+
+
+def unwrap_interpolation(token):
+    """
+    returns tokens of the expression inside "${...}" if the string is nothing but a
+    single interpolation, None otherwise
+    """
+    kind, text = token
+    if kind != STRING or not text.startswith('"${'):
+        return None
+    if scan_template(text, 3) != len(text) - 1:
+        return None
+    inner = text[3:-2].strip()
+    if not inner or "\n" in inner:
+        return None
+    inner_lines = tokenize(inner)
+    if len(inner_lines) != 1 or any(t[0] == COMMENT for t in inner_lines[0].tokens):
+        return None
+    return inner_lines[0].tokens
+
+
+def normalize_type(tokens):
+    """
+    legacy variable types, the same way terraform fmt rewrites them
+    """
+    if len(tokens) != 1:
+        return tokens
+    kind, text = tokens[0]
+    if kind == IDENT and text in ("list", "map", "set"):
+        return [tokens[0], (OPEN, "("), (IDENT, "any"), (CLOSE, ")")]
+    if kind == STRING and text == '"string"':
+        return [(IDENT, "string")]
+    if kind == STRING and text in ('"list"', '"map"'):
+        return [(IDENT, text[1:-1]), (OPEN, "("), (IDENT, "string"), (CLOSE, ")")]
+    return tokens
+
+
+def is_block_header(tokens):
+    # resource "aws_instance" "web" {
+    if len(tokens) < 2 or tokens[0][0] != IDENT or tokens[-1] != (OPEN, "{"):
+        return False
+    return all(kind in (IDENT, STRING) for kind, _ in tokens[1:-1])
+
+
+class Cells:
+    def __init__(self, indent, lead, assign, comment):
+        self.indent = indent
+        self.lead = lead
+        self.assign = assign
+        self.comment = comment
+        self.assign_spaces = 1
+        self.comment_spaces = 1
+
+    def lead_columns(self):
+        return self.indent + len(join_tokens(self.lead))
+
+    def assign_columns(self):
+        if not self.assign:
+            return 0
+        before = self.lead[-1] if self.lead else None
+        return self.assign_spaces + len(join_tokens(self.assign, before))
+
+    def render(self):
+        result = " " * self.indent + join_tokens(self.lead)
+        if self.assign:
+            before = self.lead[-1] if self.lead else None
+            result += " " * self.assign_spaces + join_tokens(self.assign, before)
+        if self.comment:
+            if self.lead or self.assign:
+                result += " " * self.comment_spaces
+            result += self.comment[1]
+        return result
+
+
+def split_cells(tokens):
+    """
+    splits a line into lead, assign ("=" and the rest of a single line attribute)
+    and trailing comment cells
+    """
+    comment = None
+    if len(tokens) > 1 and tokens[-1][0] == COMMENT:
+        comment = tokens[-1]
+        tokens = tokens[:-1]
+    elif len(tokens) == 1 and tokens[0][0] == COMMENT:
+        return [], None, tokens[0]
+
+    for i, token in enumerate(tokens):
+        if i > 0 and token == (OP, "="):
+            if bracket_change(tokens[i:]) == 0:
+                return tokens[:i], tokens[i:], comment
+            break
+    return tokens, None, comment
+
+
+def align(cells_lines, columns, set_spaces, has_cell):
+    chain = []
+
+    def close_chain():
+        widest = max(columns(c) for c in chain)
+        for c in chain:
+            set_spaces(c, widest - columns(c) + 1)
+        chain.clear()
+
+    for cells in cells_lines:
+        if cells is not None and has_cell(cells):
+            chain.append(cells)
+        elif chain:
+            close_chain()
+    if chain:
+        close_chain()
+
+
+def format_hcl(source):
+    """
+    formats HCL source the way terraform fmt would
+    :param source:
+    :return: formatted source
+    """
+    lines = tokenize(source)
+
+    # first pass: rewrite attribute values and compute indentation
+    indents = []
+    contexts = []
+    cells_lines = []
+    for line in lines:
+        if line.raw is not None or not line.tokens:
+            cells_lines.append(None)
+            continue
+
+        tokens = line.tokens
+        in_body = all(kind == "block" for kind, _ in contexts)
+        lead, assign, comment = split_cells(tokens)
+        if in_body and assign and len(lead) == 1 and lead[0][0] == IDENT:
+            value = assign[1:]
+            if lead[0][1] == "type" and [n for _, n in contexts] == ["variable"]:
+                value = normalize_type(value)
+            elif len(value) == 1:
+                value = unwrap_interpolation(value[0]) or value
+            assign = [assign[0]] + value
+
+        net = bracket_change(lead + (assign or []))
+        if net > 0:
+            indent = 2 * len(indents)
+            indents.append(net)
+        else:
+            closed = -net
+            while closed > 0 and indents:
+                if closed > indents[-1]:
+                    closed -= indents.pop()
+                elif closed < indents[-1]:
+                    indents[-1] -= closed
+                    closed = 0
+                else:
+                    indents.pop()
+                    closed = 0
+            indent = 2 * len(indents)
+
+        header = is_block_header(lead) and assign is None
+        for kind, text in lead + (assign or []):
+            if kind == OPEN:
+                if header and text == "{":
+                    contexts.append(("block", lead[0][1]))
+                else:
+                    contexts.append(("expression", None))
+            elif kind == CLOSE and contexts:
+                contexts.pop()
+            elif kind == HEREDOC:
+                break
+
+        cells_lines.append(Cells(indent, lead, assign, comment))
+
+    align(
+        cells_lines,
+        lambda c: c.lead_columns(),
+        lambda c, spaces: setattr(c, "assign_spaces", spaces),
+        lambda c: c.assign is not None,
+    )
+    align(
+        cells_lines,
+        lambda c: c.lead_columns() + c.assign_columns(),
+        lambda c, spaces: setattr(c, "comment_spaces", spaces),
+        lambda c: c.comment is not None and bool(c.lead or c.assign),
+    )
+
+    result = []
+    for line, cells in zip(lines, cells_lines):
+        if line.raw is not None:
+            result.append(line.raw)
+        elif cells is None:
+            # collapse runs of blank lines and drop the leading ones
+            if result and result[-1] != "":
+                result.append("")
+        else:
+            result.append(cells.render())
+
+    while result and result[-1] == "":
+        result.pop()
+    if not result:
+        return ""
+    return "\n".join(result) + "\n"
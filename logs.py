@@ -0,0 +1,97 @@
+"""
+Logging for the generator.
+
+Messages use %-style arguments so nothing is formatted for records below the
+level, payloads and options are logged through summarize() which caps their size.
+Debug records of a request are only emitted when the request is sampled (see
+start_request), debug logging of every request would serialize every payload.
+"""
+
+import contextvars
+import logging
+import random
+import reprlib
+import sys
+
+import settings
+
+ROOT_LOGGER = "trowel"
+
+_debug_sampled = contextvars.ContextVar("debug_sampled", default=False)
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxdict = 20
+_repr.maxlist = 20
+_repr.maxstring = 200
+_repr.maxother = 200
+
+
+class summarize:
+    """
+    size-capped repr of value, only built when the record is emitted
+    """
+
+    def __init__(self, value, limit=None):
+        self.value = value
+        self.limit = limit or settings.LOG_MAX_CHARS
+
+    def __str__(self):
+        text = _repr.repr(self.value)
+        if len(text) > self.limit:
+            text = f"{text[:self.limit]}... ({len(text) - self.limit} more chars)"
+        return text
+
+    __repr__ = __str__
+
+
+class SampledDebugFilter(logging.Filter):
+    """
+    drops records below the configured level unless the request is sampled for debug
+    """
+
+    def __init__(self, level):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno >= self.level or _debug_sampled.get()
+
+
+def configure(level=None, debug_sample_rate=None):
+    level = logging.getLevelName(level or settings.LOG_LEVEL)
+    if debug_sample_rate is None:
+        debug_sample_rate = settings.LOG_DEBUG_SAMPLE_RATE
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    # debug records have to reach the filter when some requests are sampled
+    logger.setLevel(logging.DEBUG if debug_sample_rate > 0 else level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+    # records of child loggers skip the filters of this one, filter in the handler
+    for handler in logger.handlers:
+        handler.filters = [SampledDebugFilter(level)]
+    # the lambda runtime puts its own handler on the root logger
+    logger.propagate = False
+    return logger
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def start_request(debug_sample_rate=None):
+    """
+    decides whether debug records of the current request are emitted
+    :return: True if the request is sampled
+    """
+    if debug_sample_rate is None:
+        debug_sample_rate = settings.LOG_DEBUG_SAMPLE_RATE
+    sampled = debug_sample_rate > 0 and random.random() < debug_sample_rate
+    _debug_sampled.set(sampled)
+    return sampled
+
+
+configure()
@@ -0,0 +1,71 @@
+"""
+Manifests (path -> sha256) of generated bundles, by their digest.
+
+Clients send the digest of the bundle they already hold as base_manifest and only
+get the files that changed since. Manifests are kept in memory and, when an
+artifact store is configured, also stored next to the bundles so a fresh process
+still knows them.
+"""
+
+import io
+import json
+import threading
+from collections import OrderedDict
+
+import artifacts
+import settings
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+class ManifestStore:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._manifests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, digest, manifest):
+        with self._lock:
+            self._manifests[digest] = manifest
+            self._manifests.move_to_end(digest)
+            while len(self._manifests) > self.max_entries:
+                self._manifests.popitem(last=False)
+
+        if settings.ARTIFACT_STORE_URL:
+            key = self._key(digest)
+            try:
+                store = artifacts.get_store()
+                if store.size(key) is None:
+                    store.put(key, io.BytesIO(json.dumps(manifest).encode()))
+            except Exception as e:
+                logger.warning("manifests: failed to store %s: %s", key, e)
+
+    def get(self, digest):
+        """
+        returns manifest of the bundle with given digest, None if it's unknown
+        """
+        with self._lock:
+            if digest in self._manifests:
+                self._manifests.move_to_end(digest)
+                return self._manifests[digest]
+
+        if settings.ARTIFACT_STORE_URL:
+            key = self._key(digest)
+            try:
+                store = artifacts.get_store()
+                if store.size(key) is not None:
+                    manifest = json.loads(store.get(key))
+                    with self._lock:
+                        self._manifests[digest] = manifest
+                    return manifest
+            except Exception as e:
+                logger.warning("manifests: failed to load %s: %s", key, e)
+        return None
+
+    @staticmethod
+    def _key(digest):
+        return f"manifests/{digest}.json"
+
+
+MANIFESTS = ManifestStore()
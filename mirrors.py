@@ -0,0 +1,207 @@
+"""
+Local bare mirrors of module repos for the long running server.
+
+Every module repo is mirrored once (blob filtered where the remote supports it)
+under settings.MODULE_MIRROR_DIR and fetched incrementally after that, module
+files of a commit are exported from the mirror when the module cache misses.
+Ref -> sha resolutions are cached for settings.REF_CACHE_TTL_SECONDS, refs that
+don't exist for settings.REF_CACHE_NEGATIVE_TTL_SECONDS, so a branch that hasn't
+moved costs at most a `git ls-remote` and usually nothing.
+"""
+
+import fnmatch
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import deadline
+import module_cache
+import settings
+from exceptions import GitHubError, RefNotFoundError
+from logs import get_logger
+from module_cache import GIT_KEEP_PACKS, MODULE_FILE_PATTERNS, dir_size, redact_url
+
+logger = get_logger(__name__)
+
+
+def git(mirror_dir, *args, input=None):
+    return deadline.run(
+        ["git", *GIT_KEEP_PACKS, *args],
+        cwd=mirror_dir,
+        input=input,
+        timeout_seconds=settings.GIT_TIMEOUT_SECONDS,
+    ).stdout
+
+
+def module_file(name):
+    return any(
+        fnmatch.fnmatchcase(name, pattern.lstrip("/"))
+        for pattern in MODULE_FILE_PATTERNS
+    )
+
+
+class MirrorPool:
+    def __init__(self, root, ref_ttl, negative_ttl):
+        self.root = root
+        self.ref_ttl = ref_ttl
+        self.negative_ttl = negative_ttl
+        self.ref_hits = 0
+        self.ref_misses = 0
+        self._refs = {}
+        self._lock = threading.Lock()
+        self._mirror_locks = {}
+
+    def stats(self):
+        return {"ref_hits": self.ref_hits, "ref_misses": self.ref_misses}
+
+    def resolve(self, url, ref):
+        """
+        returns commit sha url@ref points to, cached for ref_ttl seconds
+        :raises RefNotFoundError: ref doesn't exist, cached for negative_ttl seconds
+        """
+        key = (url, ref)
+        with self._lock:
+            entry = self._refs.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.ref_hits += 1
+                sha = entry[1]
+                if sha is None:
+                    raise RefNotFoundError(
+                        f"Failed to resolve {redact_url(url)}, "
+                        f"branch: {ref} does not exist"
+                    )
+                return sha
+            self.ref_misses += 1
+
+        try:
+            sha = module_cache.resolve_ref(url, ref)
+        except RefNotFoundError:
+            self._remember(key, None, self.negative_ttl)
+            raise
+        self._remember(key, sha, self.ref_ttl)
+        return sha
+
+    def export(self, url, sha, dest_dir):
+        """
+        writes the module files of commit sha into dest_dir, fetching the mirror
+        first if it doesn't have the commit yet
+        :return: bytes fetched into the mirror
+        """
+        mirror_dir = self._mirror_dir(url)
+        with self._mirror_lock(mirror_dir):
+            size = dir_size(mirror_dir)
+            try:
+                self._ensure_commit(url, mirror_dir, sha)
+                files = self._module_files(mirror_dir, sha)
+            except subprocess.CalledProcessError as cpe:
+                logger.error(
+                    "mirror export failed: %s@%s, exit code %s",
+                    redact_url(url),
+                    sha,
+                    cpe.returncode,
+                )
+                raise GitHubError(f"Failed to fetch {redact_url(url)} at {sha}")
+            except subprocess.TimeoutExpired:
+                raise GitHubError(f"Timed out fetching {redact_url(url)} at {sha}")
+            fetched_bytes = dir_size(mirror_dir) - size
+
+        for name, content in files.items():
+            with open(os.path.join(dest_dir, name), "wb") as f:
+                f.write(content)
+        return fetched_bytes
+
+    def _remember(self, key, sha, ttl):
+        with self._lock:
+            self._refs[key] = (time.monotonic() + ttl, sha)
+
+    def _ensure_commit(self, url, mirror_dir, sha):
+        if not os.path.isdir(mirror_dir):
+            os.makedirs(self.root, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=".mirror-")
+            try:
+                git(
+                    self.root,
+                    "clone",
+                    "-q",
+                    "--mirror",
+                    "--filter=blob:none",
+                    "--",
+                    url,
+                    tmp_dir,
+                )
+                os.rename(tmp_dir, mirror_dir)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.info("mirrored %s", redact_url(url))
+        if self._has_commit(mirror_dir, sha):
+            return
+        git(mirror_dir, "fetch", "-q", "--prune", "origin")
+        if not self._has_commit(mirror_dir, sha):
+            # commit no ref points to anymore, e.g. before a force push
+            git(mirror_dir, "fetch", "-q", "origin", sha)
+
+    def _has_commit(self, mirror_dir, sha):
+        try:
+            deadline.run(
+                ["git", "cat-file", "-e", f"{sha}^{{commit}}"],
+                cwd=mirror_dir,
+                # don't let a partial mirror fetch the commit on its own, fetch does
+                env={**os.environ, "GIT_NO_LAZY_FETCH": "1"},
+                timeout_seconds=settings.GIT_TIMEOUT_SECONDS,
+            )
+        except subprocess.CalledProcessError:
+            return False
+        return True
+
+    def _module_files(self, mirror_dir, sha):
+        blobs = {}
+        for line in git(mirror_dir, "ls-tree", sha).decode().splitlines():
+            info, name = line.split("\t", 1)
+            mode, kind, oid = info.split()
+            if kind == "blob" and mode.startswith("100") and module_file(name):
+                blobs[name] = oid
+        if not blobs:
+            return {}
+
+        ids = list(blobs.values())
+        promisor = git(mirror_dir, "config", "--default", "", "remote.origin.promisor")
+        if promisor.strip() == b"true":
+            # one round trip for the blobs a partial mirror is missing instead of
+            # one lazy fetch per blob
+            git(mirror_dir, "fetch", "-q", "--filter=blob:none", "origin", *ids)
+        out = git(mirror_dir, "cat-file", "--batch", input="\n".join(ids).encode())
+
+        contents = {}
+        pos = 0
+        for _ in ids:
+            header_end = out.index(b"\n", pos)
+            oid, _, size = out[pos:header_end].decode().split()
+            start = header_end + 1
+            contents[oid] = out[start : start + int(size)]
+            pos = start + int(size) + 1
+        return {name: contents[oid] for name, oid in blobs.items()}
+
+    def _mirror_dir(self, url):
+        url_hash = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return os.path.join(self.root, f"{url_hash}.git")
+
+    def _mirror_lock(self, mirror_dir):
+        with self._lock:
+            return self._mirror_locks.setdefault(mirror_dir, threading.Lock())
+
+
+def enable_mirrors(cache=None):
+    """
+    makes the module cache resolve and fetch through a MirrorPool
+    """
+    cache = cache or module_cache.MODULE_CACHE
+    cache.mirrors = MirrorPool(
+        settings.MODULE_MIRROR_DIR,
+        settings.REF_CACHE_TTL_SECONDS,
+        settings.REF_CACHE_NEGATIVE_TTL_SECONDS,
+    )
+    return cache.mirrors
@@ -0,0 +1,358 @@
+"""
+Content-addressed cache of cloned module repos.
+
+Entries are keyed by repo url and the commit sha the requested ref resolves to, so
+a warm invocation only pays for a `git ls-remote` and a local read instead of a
+full clone. Misses fetch only the files the generator reads (see fetch_module): a
+shallow, blob filtered clone with a sparse checkout of the top level terraform and
+template files, so docs, examples and tests of a module repo are never downloaded.
+The cache lives on disk under settings.MODULE_CACHE_DIR and is bounded in size,
+least recently used entries are evicted first. With a mirrors.MirrorPool
+attached (the long running server), refs are resolved through its ref cache and
+misses are exported from local mirrors instead of cloned.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import deadline
+import settings
+from exceptions import DeadlineExceeded, GitHubError, RefNotFoundError
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+def clone_repo(url, ref, path="."):
+    clone = ["git", "clone", "-q", "--depth", "1"]
+    if ref is not None:
+        clone += ["--branch", ref]
+    try:
+        deadline.run(
+            clone + ["--", url, path], timeout_seconds=settings.GIT_TIMEOUT_SECONDS
+        )
+    except subprocess.CalledProcessError as cpe:
+        logger.error(
+            "clone_repo failed: %s, branch: %s, exit code %s",
+            redact_url(url),
+            ref,
+            cpe.returncode,
+        )
+        raise GitHubError(f"Failed to clone {redact_url(url)}, branch: {ref}")
+    except subprocess.TimeoutExpired:
+        raise GitHubError(f"Timed out cloning {redact_url(url)}, branch: {ref}")
+
+
+# top level files utils.run_jinja_for_dir reads, sparse checkout (gitignore) syntax
+MODULE_FILE_PATTERNS = ("/*.tf*", "/*.template.*")
+
+# keep fetched objects packed as received, fetched bytes are the size of the packs
+GIT_KEEP_PACKS = ["-c", "transfer.unpackLimit=1", "-c", "fetch.unpackLimit=1"]
+
+
+def fetch_module(url, ref, path):
+    """
+    checks out the files matching MODULE_FILE_PATTERNS of url@ref into path. Blobs
+    are fetched for those files only, remotes that don't support partial clone send
+    every blob of the commit. A clone still running after settings.CLONE_HEDGE_SECONDS
+    gets another one racing it, see deadline.hedged.
+    :param url:
+    :param ref: branch or tag name, remote HEAD if None
+    :param path: empty or missing directory
+    :return: bytes of git objects fetched
+    """
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    attempts_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".fetch-")
+
+    def attempt(cancel):
+        attempt_dir = tempfile.mkdtemp(dir=attempts_dir)
+        return attempt_dir, fetch_module_attempt(url, ref, attempt_dir, cancel)
+
+    try:
+        attempt_dir, fetched_bytes = deadline.hedged(
+            attempt, settings.CLONE_ATTEMPTS, settings.CLONE_HEDGE_SECONDS
+        )
+        if os.path.isdir(path):
+            os.rmdir(path)
+        os.rename(attempt_dir, path)
+    except subprocess.CalledProcessError as cpe:
+        logger.error(
+            "fetch_module failed: %s, branch: %s, exit code %s",
+            redact_url(url),
+            ref,
+            cpe.returncode,
+        )
+        raise GitHubError(f"Failed to clone {redact_url(url)}, branch: {ref}")
+    except subprocess.TimeoutExpired:
+        raise GitHubError(f"Timed out cloning {redact_url(url)}, branch: {ref}")
+    finally:
+        shutil.rmtree(attempts_dir, ignore_errors=True)
+    return fetched_bytes
+
+
+def fetch_module_attempt(url, ref, path, cancel=None):
+    clone = ["git", *GIT_KEEP_PACKS, "clone", "-q", "--depth", "1"]
+    clone += ["--filter=blob:none", "--no-checkout"]
+    if ref is not None:
+        clone += ["--branch", ref]
+    timeout = settings.GIT_TIMEOUT_SECONDS
+    deadline.run(clone + ["--", url, path], timeout_seconds=timeout, cancel=cancel)
+    deadline.run(["git", "config", "core.sparseCheckout", "true"], cwd=path)
+    info_dir = os.path.join(path, ".git", "info")
+    os.makedirs(info_dir, exist_ok=True)
+    with open(os.path.join(info_dir, "sparse-checkout"), "w") as f:
+        f.write("\n".join(MODULE_FILE_PATTERNS) + "\n")
+    # blobs of the files matching the patterns are fetched on checkout
+    deadline.run(
+        ["git", *GIT_KEEP_PACKS, "checkout", "-q", "HEAD"],
+        cwd=path,
+        timeout_seconds=timeout,
+        cancel=cancel,
+    )
+    return dir_size(os.path.join(path, ".git", "objects"))
+
+
+def redact_url(url):
+    """
+    returns url without credentials, for messages
+    """
+    return re.sub(r"//[^/@]*@", "//", url)
+
+
+def resolve_ref(url, ref):
+    """
+    returns commit sha the ref (branch or tag) currently points to in the remote repo
+    :param url:
+    :param ref: branch or tag name, remote HEAD if None
+    :return:
+    """
+    ref = ref or "HEAD"
+    try:
+        result = deadline.run(
+            ["git", "ls-remote", "--", url, ref],
+            timeout_seconds=settings.GIT_TIMEOUT_SECONDS,
+        )
+    except subprocess.CalledProcessError as cpe:
+        logger.error("resolve_ref exception: %s", cpe.stderr.decode())
+        raise GitHubError(f"Failed to resolve {redact_url(url)}, branch: {ref}")
+    except subprocess.TimeoutExpired:
+        raise GitHubError(f"Timed out resolving {redact_url(url)}, branch: {ref}")
+
+    refs = {}
+    for line in result.stdout.decode().splitlines():
+        sha, name = line.split("\t", 1)
+        refs[name] = sha
+
+    # prefer peeled sha of annotated tags, then branches, then anything else
+    for name in (f"refs/tags/{ref}^{{}}", f"refs/heads/{ref}", ref):
+        if name in refs:
+            return refs[name]
+    if refs:
+        return next(iter(refs.values()))
+    raise RefNotFoundError(
+        f"Failed to resolve {redact_url(url)}, branch: {ref} does not exist"
+    )
+
+
+def head_sha(path):
+    result = deadline.run(["git", "rev-parse", "HEAD"], cwd=path)
+    return result.stdout.decode().strip()
+
+
+def dir_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+    return size
+
+
+class ModuleCache:
+    def __init__(self, root, max_bytes, mirrors=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mirrors = mirrors
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fetched_bytes = 0
+        self.stale = 0
+        # commit each url@ref was last served at, served again if a fresh one can't be
+        self._served = {}
+        self._lock = threading.Lock()
+        self._entry_locks = {}
+
+    def stats(self):
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fetched_bytes": self.fetched_bytes,
+            "stale": self.stale,
+        }
+        if self.mirrors is not None:
+            stats.update(self.mirrors.stats())
+        return stats
+
+    def resolve(self, url, ref):
+        """
+        returns commit sha url@ref points to. The commit it was served at last is
+        returned instead (stale) when resolving fails or would leave less than
+        settings.MODULE_FETCH_SECONDS, or when the new commit isn't cached and
+        there's not enough time left to fetch it.
+        """
+        stale = self._served.get((url, ref))
+        if stale is not None and not os.path.isdir(self._entry_dir(url, stale)):
+            stale = None
+        try:
+            # a stalled resolve mustn't use up the time serving stale would leave
+            reserved = settings.MODULE_FETCH_SECONDS if stale is not None else 0
+            with deadline.reserve(reserved):
+                if self.mirrors is not None:
+                    sha = self.mirrors.resolve(url, ref)
+                else:
+                    sha = resolve_ref(url, ref)
+        except RefNotFoundError:
+            raise
+        except (GitHubError, DeadlineExceeded) as e:
+            if stale is None:
+                raise
+            return self._serve_stale(url, ref, stale, e.message)
+
+        if (
+            stale is not None
+            and sha != stale
+            and not os.path.isdir(self._entry_dir(url, sha))
+            and not deadline.has(settings.MODULE_FETCH_SECONDS)
+        ):
+            return self._serve_stale(url, ref, stale, f"no time to fetch {sha}")
+        return sha
+
+    def _serve_stale(self, url, ref, sha, reason):
+        logger.warning(
+            "module cache: serving %s@%s at %s: %s", redact_url(url), ref, sha, reason
+        )
+        with self._lock:
+            self.stale += 1
+        return sha
+
+    def read(self, url, ref, sha=None):
+        """
+        returns contents of the top level files of the module at url@ref, fetching
+        it only if the resolved commit is not cached yet
+        :param url:
+        :param ref:
+        :param sha: commit ref was already resolved to, resolved again if not given
+        :return: commit sha and dict of file name -> bytes
+        """
+        files = {}
+
+        def load(entry_dir):
+            for name in sorted(os.listdir(entry_dir)):
+                path = os.path.join(entry_dir, name)
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        files[name] = f.read()
+
+        sha = self._use(url, ref, load, sha)
+        return sha, files
+
+    def _use(self, url, ref, fn, sha=None):
+        sha = sha or self.resolve(url, ref)
+        entry_dir = self._entry_dir(url, sha)
+
+        with self._entry_lock(entry_dir):
+            if os.path.isdir(entry_dir):
+                with self._lock:
+                    self.hits += 1
+                # mtime of the entry dir is what LRU eviction is based on
+                os.utime(entry_dir)
+            else:
+                with self._lock:
+                    self.misses += 1
+                sha = self._fill(url, ref, sha)
+                entry_dir = self._entry_dir(url, sha)
+
+            fn(entry_dir)
+
+        with self._lock:
+            self._served[(url, ref)] = sha
+        self.evict(keep=entry_dir)
+        return sha
+
+    def evict(self, keep=None):
+        with self._lock:
+            if not os.path.isdir(self.root):
+                return
+            entries = []
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.startswith(".") or not os.path.isdir(path):
+                    continue
+                entries.append((os.path.getmtime(path), dir_size(path), path))
+
+            total = sum(e[1] for e in entries)
+            # oldest first, the entry that was just used is never evicted
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                # skip entries another thread is copying from right now
+                entry_lock = self._entry_locks.get(path)
+                if entry_lock and not entry_lock.acquire(blocking=False):
+                    continue
+                try:
+                    logger.info("module cache: evicting %s", path)
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    if entry_lock:
+                        entry_lock.release()
+                total -= size
+                self.evictions += 1
+
+    def _fill(self, url, ref, sha):
+        os.makedirs(self.root, exist_ok=True)
+        # clone next to the cache entries so the final rename is atomic
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=".clone-")
+        try:
+            if self.mirrors is not None:
+                fetched_bytes = self.mirrors.export(url, sha, tmp_dir)
+            else:
+                fetched_bytes = fetch_module(url, ref, tmp_dir)
+                # the ref may have moved since it was resolved, key by what was cloned
+                sha = head_sha(tmp_dir)
+                shutil.rmtree(os.path.join(tmp_dir, ".git"))
+            with self._lock:
+                self.fetched_bytes += fetched_bytes
+            logger.info(
+                "module cache: fetched %s@%s (%s), %s bytes",
+                redact_url(url),
+                ref,
+                sha,
+                fetched_bytes,
+            )
+            entry_dir = self._entry_dir(url, sha)
+            if os.path.isdir(entry_dir):
+                os.utime(entry_dir)
+            else:
+                os.rename(tmp_dir, entry_dir)
+            return sha
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _entry_dir(self, url, sha):
+        url_hash = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return os.path.join(self.root, f"{url_hash}-{sha}")
+
+    def _entry_lock(self, entry_dir):
+        with self._lock:
+            return self._entry_locks.setdefault(entry_dir, threading.Lock())
+
+
+MODULE_CACHE = ModuleCache(settings.MODULE_CACHE_DIR, settings.MODULE_CACHE_MAX_BYTES)
@@ -0,0 +1,126 @@
+"""
+In-memory tree of the generated terraform project.
+
+Rendering, policy generation, static files, overrides and custom terraform all
+write into one OutputTree (relative path -> bytes) and the archive is built from
+it, nothing is written to disk unless the tree is explicitly dumped.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import threading
+
+
+class OutputTree:
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def write(self, path, content):
+        if isinstance(content, str):
+            content = content.encode()
+        with self._lock:
+            self._files[self._normalize(path)] = content
+
+    def read(self, path):
+        with self._lock:
+            return self._files[self._normalize(path)]
+
+    def remove_dir(self, path):
+        """
+        removes every file under path, what recreating the directory used to do
+        """
+        prefix = self._normalize(path) + "/"
+        with self._lock:
+            for name in [n for n in self._files if n.startswith(prefix)]:
+                del self._files[name]
+
+    def subtree(self, path):
+        """
+        returns files under path, keyed by their path relative to it
+        """
+        prefix = self._normalize(path) + "/"
+        with self._lock:
+            return {
+                name[len(prefix) :]: content
+                for name, content in self._files.items()
+                if name.startswith(prefix)
+            }
+
+    def select(self, paths):
+        """
+        returns a new tree with only the given files
+        """
+        selected = OutputTree()
+        for path in paths:
+            selected.write(path, self.read(path))
+        return selected
+
+    def paths(self):
+        with self._lock:
+            return sorted(self._files)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._files.items())
+
+    def manifest(self):
+        """
+        returns sha256 of every file by path
+        """
+        return {
+            path: hashlib.sha256(content).hexdigest() for path, content in self.items()
+        }
+
+    def digest(self):
+        """
+        returns hash of the whole tree, equal trees always have equal digests
+        """
+        return manifest_digest(self.manifest())
+
+    def dump(self, dest_dir):
+        """
+        writes the tree into dest_dir, replacing whatever was there
+        :param dest_dir:
+        :return:
+        """
+        if os.path.isdir(dest_dir):
+            shutil.rmtree(dest_dir)
+        os.makedirs(os.path.abspath(dest_dir))
+        for path, content in self.items():
+            file_path = os.path.join(dest_dir, *path.split("/"))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb") as f:
+                f.write(content)
+
+    def __contains__(self, path):
+        with self._lock:
+            return self._normalize(path) in self._files
+
+    def __len__(self):
+        return len(self._files)
+
+    @staticmethod
+    def _normalize(path):
+        path = posixpath.normpath(path.replace(os.sep, "/")).lstrip("/")
+        if path in ("", ".") or path.startswith("../"):
+            raise ValueError(f"Invalid output path {path}")
+        return path
+
+
+def manifest_digest(manifest):
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+def manifest_delta(base, manifest):
+    """
+    returns paths added, changed and deleted going from base manifest to manifest
+    """
+    return {
+        "added": sorted(p for p in manifest if p not in base),
+        "changed": sorted(p for p in manifest if p in base and base[p] != manifest[p]),
+        "deleted": sorted(p for p in base if p not in manifest),
+    }
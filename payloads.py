@@ -1,10 +1,21 @@
+import copy
 import json
 from enum import Enum
 from typing import List, Optional, Dict
 
-from pydantic import BaseModel, ValidationError, constr, root_validator, validator
+from pydantic import (
+    BaseModel,
+    ValidationError,
+    conint,
+    constr,
+    root_validator,
+    validator,
+)
 
 from exceptions import PayloadValidationException
+from logs import get_logger, summarize
+
+logger = get_logger(__name__)
 
 
 class BlockTypeEnum(Enum):
@@ -29,6 +40,11 @@ class RdsEngineEnum(Enum):
     mysql = "mysql"
 
 
+class OutputModeEnum(Enum):
+    inline = "inline"
+    reference = "reference"
+
+
 class EnvironmentVariable(BaseModel):
     key: constr(min_length=1)
     value: str
@@ -94,7 +110,7 @@ class Block(BaseModel):
         block_type = values["type"]
         name = values["name"]
         
-        print(f'block_type: {block_type}, name: {name}')
+        logger.debug("block_type: %s, name: %s", block_type, name)
         if block_type not in cls.Config.required_by_block:
             raise ValueError(f"Can't find '{block_type}' in Config.required_by_block: {cls.Config.required_by_block}")
 
@@ -125,7 +141,7 @@ class Block(BaseModel):
             and "resource_type" in values
             and values["resource_type"] == "redis"
         ):
-            print(f'redis_mandatory_parameters: {values}')
+            logger.debug("redis_mandatory_parameters: %s", summarize(values))
             if "redis_engine_version" not in values:
                 raise ValueError(f"Missing mandatory 'redis_engine_version' parameter in '{values['name']}' block")
         return values
@@ -157,6 +173,54 @@ class PayloadGenerateTerraform(BaseModel):
     hosted_zone_name: Optional[str]
     created: Optional[int]
 
+    parallel: Optional[bool]
+    max_workers: Optional[conint(ge=1)]
+    compression_level: Optional[conint(ge=0, le=9)]
+    output_mode: Optional[OutputModeEnum]
+    base_manifest: Optional[constr(regex=r"^[0-9a-f]{64}$")]
+    if_none_match: Optional[str]
+    cache: Optional[bool]
+    include_timings: Optional[bool]
+
+
+class PayloadGenerateTerraformBatch(BaseModel):
+    payloads: Optional[List[dict]]
+    base: Optional[dict]
+    environments: Optional[Dict[str, dict]]
+
+    @root_validator
+    def payloads_or_environments(cls, values):
+        has_payloads = bool(values.get("payloads"))
+        has_environments = values.get("base") is not None and bool(values.get("environments"))
+        if has_payloads == has_environments:
+            raise ValueError("Batch needs either 'payloads' or 'base' and 'environments'")
+        return values
+
+
+def batch_environments(batch):
+    """
+    returns (name, payload) of every environment of a batch request. Payloads are named by their id,
+    environments get the base payload with their overrides applied: blocks are merged into the base
+    block of the same name (or added), any other key replaces the base one.
+    :param batch:
+    :return:
+    """
+    if batch.get("payloads"):
+        return [(payload.get("id"), payload) for payload in batch["payloads"]]
+
+    environments = []
+    for name, overrides in batch["environments"].items():
+        payload = copy.deepcopy(batch["base"])
+        overrides = copy.deepcopy(overrides)
+        block_overrides = {b.get("name"): b for b in overrides.pop("blocks", [])}
+        for block in payload.get("blocks", []):
+            block.update(block_overrides.pop(block.get("name"), {}))
+        if block_overrides:
+            payload.setdefault("blocks", []).extend(block_overrides.values())
+        payload.update(overrides)
+        environments.append((name, payload))
+    return environments
+
 
 def validate_payload(payload, cls):
     try:
@@ -0,0 +1,61 @@
+"""
+Process-wide memo of rendered blocks.
+
+A block's rendered files only depend on its own options, the root options it
+reads and the commit of the module it's rendered from (module templates are
+content-addressed by that sha). When an environment is regenerated after changing
+one container, only that container is rendered again, every other block is copied
+from here without even reading its module.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import settings
+
+
+def render_key(*parts):
+    """
+    returns a stable hash of json serializable parts, dict key order doesn't matter
+    """
+    canonical = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get(self, key):
+        """
+        returns (files, block options) the block was rendered to, None if unknown
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        files, block = entry
+        return dict(files), copy.deepcopy(block)
+
+    def put(self, key, files, block):
+        with self._lock:
+            self._entries[key] = (dict(files), copy.deepcopy(block))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+RENDER_CACHE = RenderCache(settings.RENDER_CACHE_MAX_ENTRIES)
@@ -0,0 +1,92 @@
+"""
+Process-wide cache of whole generated projects.
+
+Retries and reconciliation loops re-submit identical payloads. Entries are keyed
+by the canonical payload, the commit every referenced module (and the overrides
+repo) resolves to and the content of the root templates and static files, so a
+hit only costs a `git ls-remote` per distinct repo@ref. Entries expire after a
+TTL and the cache is bounded by the total size of the cached projects.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import settings
+
+
+def files_digest(path, pattern=r".*", recursive=True):
+    """
+    returns hash of names and content of files under path matching pattern,
+    None if path doesn't exist
+    """
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        if not recursive:
+            dirs.clear()
+        dirs.sort()
+        for f in sorted(files):
+            if not re.match(pattern, f):
+                continue
+            file_path = os.path.join(root, f)
+            digest.update(os.path.relpath(file_path, path).encode() + b"\0")
+            with open(file_path, "rb") as fp:
+                digest.update(hashlib.sha256(fp.read()).digest())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get(self, key):
+        """
+        returns the cached project tree, None if there is none or it expired.
+        The tree is shared and must not be modified.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, tree):
+        size = sum(len(content) for _, content in tree.items())
+        if self.ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tree, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+
+RESULT_CACHE = ResultCache(
+    settings.RESULT_CACHE_MAX_BYTES, settings.RESULT_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,132 @@
+"""
+Runs the per-block generation tasks of a terraform project in dependency order,
+either one after another or on a bounded thread pool.
+
+Every block declares which other blocks it consumes (network outputs, secret
+mappings, ##module.x## placeholders...). A block is started as soon as everything
+it consumes is done, so unrelated blocks never wait for each other. Block tasks
+spend most of their time waiting on git and terraform subprocesses, so with
+threads a big environment finishes in roughly the time of its longest chain.
+"""
+
+import contextvars
+import heapq
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from exceptions import PayloadValidationException
+
+
+class BlockTask:
+    def __init__(self, name, dest_dir, fn):
+        self.name = name
+        self.dest_dir = dest_dir
+        self.fn = fn
+
+    def __call__(self):
+        return self.fn()
+
+
+def topological_order(tasks, dependencies):
+    """
+    orders tasks so that every task comes after the tasks it depends on, ties are
+    kept in the given order. Dependencies on names without a task are ignored.
+    :param tasks: list of BlockTask
+    :param dependencies: dict of task name -> set of task names
+    :return: list of BlockTask
+    """
+    position, remaining, dependents = dependency_graph(tasks, dependencies)
+
+    ready = [position[name] for name, deps in remaining.items() if not deps]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        task = tasks[heapq.heappop(ready)]
+        order.append(task)
+        for dependent in dependents.get(task.name, []):
+            remaining[dependent].discard(task.name)
+            if not remaining[dependent]:
+                heapq.heappush(ready, position[dependent])
+
+    if len(order) < len(tasks):
+        cycle = find_cycle({name: deps for name, deps in remaining.items() if deps})
+        raise PayloadValidationException(
+            f"Dependency cycle between blocks: {' -> '.join(cycle)}"
+        )
+    return order
+
+
+def dependency_graph(tasks, dependencies):
+    """
+    :return: task positions, dependencies and dependents of each task, all by name
+    """
+    position = {}
+    for i, task in enumerate(tasks):
+        if task.name in position:
+            raise PayloadValidationException(f"Duplicate block name '{task.name}'.")
+        position[task.name] = i
+
+    remaining = {
+        task.name: set(dependencies.get(task.name, ())) & position.keys()
+        for task in tasks
+    }
+    dependents = {}
+    for name, deps in remaining.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(name)
+    return position, remaining, dependents
+
+
+def find_cycle(graph):
+    # every node left in the graph is part of or behind a cycle, walk until a node repeats
+    path = [next(iter(graph))]
+    while True:
+        node = min(graph[path[-1]] & graph.keys())
+        if node in path:
+            return path[path.index(node) :] + [node]
+        path.append(node)
+
+
+def run_tasks(tasks, dependencies=None, max_workers=1):
+    """
+    runs all tasks in dependency order and re-raises the first failure.
+    Missing dependencies and cycles are rejected before any task is started.
+    :param tasks: list of BlockTask
+    :param dependencies: dict of task name -> set of task names it needs to run after
+    :param max_workers: 1 runs tasks serially in the calling thread
+    :return:
+    """
+    dependencies = dependencies or {}
+    order = topological_order(tasks, dependencies)
+
+    if max_workers <= 1:
+        for task in order:
+            task()
+        return
+
+    position, remaining, dependents = dependency_graph(tasks, dependencies)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+
+        def submit(names):
+            for name in sorted(names, key=position.get):
+                # tasks see the context of the request, e.g. whether it logs debug
+                task = partial(contextvars.copy_context().run, tasks[position[name]])
+                running[executor.submit(task)] = name
+
+        submit([name for name, deps in remaining.items() if not deps])
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            ready = []
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+                for dependent in dependents.get(name, []):
+                    remaining[dependent].discard(name)
+                    if not remaining[dependent]:
+                        ready.append(dependent)
+            submit(ready)
@@ -0,0 +1,177 @@
+"""
+HTTP server exposing handler.generate_terraform for long running deployments (ECS).
+
+The process stays up between requests, so module, template, render and result
+caches stay warm and requests don't pay for cold starts. Requests are served by a
+bounded pool of worker threads, connections beyond the pool and its queue are
+turned away with 503 instead of piling up. Module repos are kept as local mirrors
+(see mirrors.py) and refs resolved through a TTL cache.
+
+    POST /                  body: generate terraform payload, If-None-Match honoured
+    POST /batch             body: batch of payloads, see handler.generate_terraform_batch
+    GET  /health            200 when the server accepts requests
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import handler
+import logs
+import mirrors
+import settings
+
+logger = logs.get_logger(__name__)
+
+SERVICE_UNAVAILABLE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Retry-After: 1\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+
+# handler functions by path, looked up on the handler module for every request
+ROUTES = {
+    "/": "generate_terraform",
+    "/generate-terraform": "generate_terraform",
+    "/batch": "generate_terraform_batch",
+}
+
+
+def response_body(result):
+    """
+    returns the handler result as json, the way a lambda invocation returns it
+    """
+    # base64 encoded archives
+    return json.dumps(result, default=bytes.decode).encode()
+
+
+class GenerateTerraformRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0, connections are closed after the response and don't hold on to a worker
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"{self.path} not found"})
+            return
+        self.send_json(200, {"status": "ok"})
+
+    def do_POST(self):
+        if self.path not in ROUTES:
+            self.send_json(404, {"error": f"{self.path} not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_json(400, {"error": "Invalid Content-Length"})
+            return
+        if length > settings.SERVER_MAX_REQUEST_BYTES:
+            self.send_json(413, {"error": "Payload too large"})
+            return
+        try:
+            body = self.rfile.read(length).decode()
+        except UnicodeDecodeError:
+            self.send_json(400, {"error": "Request body is not valid UTF-8"})
+            return
+
+        # same event a lambda function url delivers, the handler parses the body and
+        # answers 400 when it isn't a json object
+        event = {"body": body, "headers": dict(self.headers.items())}
+        result = getattr(handler, ROUTES[self.path])(event, None)
+
+        status = result.get("statusCode", 200)
+        headers = result.get("headers") or {}
+        if status == 304:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_json(status, result, headers)
+
+    def send_json(self, status, result, headers=None):
+        body = response_body(result)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s - " + format, self.address_string(), *args)
+
+
+class GeneratorServer(HTTPServer):
+    """
+    HTTPServer handing connections to a bounded pool of worker threads
+    """
+
+    def __init__(self, address, workers=None, queue_size=None):
+        workers = workers or settings.SERVER_WORKERS
+        if queue_size is None:
+            queue_size = settings.SERVER_QUEUE_SIZE
+        super().__init__(address, GenerateTerraformRequestHandler)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="generator"
+        )
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            logger.warning("server busy, rejecting %s", client_address)
+            try:
+                # take the request off the wire first, clients fail to read a response
+                # to a request they couldn't finish sending
+                request.settimeout(0.5)
+                request.recv(65536)
+                request.sendall(SERVICE_UNAVAILABLE)
+            except OSError:
+                pass
+            finally:
+                self.shutdown_request(request)
+            return
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def warm_up():
+    """
+    imports everything handler imports lazily, so the first request doesn't pay for it
+    """
+    import payloads
+    import utils
+
+
+def serve(host=None, port=None):
+    host = host if host is not None else settings.SERVER_HOST
+    port = port if port is not None else settings.SERVER_PORT
+    warm_up()
+    if settings.MODULE_MIRRORS:
+        mirrors.enable_mirrors()
+    server = GeneratorServer((host, port))
+    logger.info("serving on %s:%s, %s workers", host, port, server.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,114 @@
+"""
+Runtime settings, read once from the environment at import time.
+"""
+
+import os
+
+# scratch root for everything kept between warm invocations, must live on a
+# writable volume (only /tmp is writable in lambda)
+CACHE_ROOT = os.environ.get("TROWEL_CACHE_DIR", "/tmp/trowel-cache")
+
+# module repos are cloned from f"{MODULE_BASE_URL}/{repo}"
+MODULE_BASE_URL = os.environ.get(
+    "TROWEL_MODULE_BASE_URL", "https://github.com/diggerhq"
+)
+
+# module targets payloads may use besides diggerhq/<name>@<ref>, comma separated:
+# "git" (git+<url>), "file" (file://), "dir" (dir://) and "tar" (tarballs). Those
+# modules come from the caller, none are allowed unless the operator enables them
+MODULE_SOURCES = frozenset(
+    kind for kind in os.environ.get("TROWEL_MODULE_SOURCES", "").split(",") if kind
+)
+
+# lambda has 512MB of /tmp by default, keep the module cache well below that
+MODULE_CACHE_DIR = os.path.join(CACHE_ROOT, "modules")
+MODULE_CACHE_MAX_BYTES = int(
+    os.environ.get("TROWEL_MODULE_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+)
+
+# worker threads used for block generation when a payload asks for "parallel"
+MAX_WORKERS = int(os.environ.get("TROWEL_MAX_WORKERS", 4))
+
+# compiled jinja templates, empty string disables the on-disk bytecode cache
+JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+    "TROWEL_JINJA_CACHE_DIR", os.path.join(CACHE_ROOT, "jinja")
+)
+
+# "python" formats generated terraform in-process, falling back to the terraform
+# binary for input it can't handle; "terraform" always runs `terraform fmt`
+HCL_FORMATTER = os.environ.get("TROWEL_HCL_FORMATTER", "python")
+
+# projects are generated in memory, set to also write each one to
+# f"{OUTPUT_DUMP_DIR}/terraform" for debugging
+OUTPUT_DUMP_DIR = os.environ.get("TROWEL_OUTPUT_DUMP_DIR") or None
+
+# zlib level of the returned bundle, 0 stores files uncompressed
+ZIP_COMPRESSLEVEL = int(os.environ.get("TROWEL_ZIP_COMPRESSLEVEL", 6))
+
+# where bundles requested with output_mode "reference" are put, s3://bucket/prefix
+# or a local directory
+ARTIFACT_STORE_URL = os.environ.get("TROWEL_ARTIFACT_STORE")
+
+# rendered blocks kept in memory between requests, 0 disables the render cache
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get("TROWEL_RENDER_CACHE_SIZE", 256))
+
+# whole generated projects kept for identical re-submitted payloads, a TTL of 0
+# disables the result cache
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("TROWEL_RESULT_CACHE_TTL", 300))
+RESULT_CACHE_MAX_BYTES = int(
+    os.environ.get("TROWEL_RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+
+# level of the generator's logs, DEBUG logs options and payloads of every request
+LOG_LEVEL = os.environ.get("TROWEL_LOG_LEVEL", "INFO").upper()
+
+# share of requests logged at DEBUG regardless of LOG_LEVEL
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("TROWEL_LOG_DEBUG_SAMPLE_RATE", 0))
+
+# logged payloads and options are cut to this many characters
+LOG_MAX_CHARS = int(os.environ.get("TROWEL_LOG_MAX_CHARS", 1000))
+
+# root templates (backend.template.tf...) are read from here, the lambda image has
+# them next to the code
+TF_TEMPLATES_DIR = os.environ.get("TROWEL_TF_TEMPLATES_DIR", "")
+
+# http server (server.py, run_ecs.py): requests served at once and connections
+# allowed to wait for a worker, more are rejected with 503
+SERVER_HOST = os.environ.get("TROWEL_SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("TROWEL_SERVER_PORT", 8080))
+SERVER_WORKERS = int(os.environ.get("TROWEL_SERVER_WORKERS", 4))
+SERVER_QUEUE_SIZE = int(os.environ.get("TROWEL_SERVER_QUEUE_SIZE", 16))
+SERVER_MAX_REQUEST_BYTES = int(
+    os.environ.get("TROWEL_SERVER_MAX_REQUEST_BYTES", 10 * 1024 * 1024)
+)
+
+# snapshot of module repos vendored into the image by vendor_modules.py, git
+# targets found in it are read from there and never fetched. Refs are pinned to the
+# commit they pointed to when the image was built
+VENDOR_DIR = os.environ.get("TROWEL_VENDOR_DIR") or None
+
+# the HTTP server keeps local mirrors of module repos and resolves refs through a
+# cache, a ref moved less than REF_CACHE_TTL_SECONDS ago may still resolve to its
+# previous commit. Refs that don't exist are remembered for a shorter time
+MODULE_MIRRORS = os.environ.get("TROWEL_MODULE_MIRRORS", "1") == "1"
+MODULE_MIRROR_DIR = os.environ.get(
+    "TROWEL_MODULE_MIRROR_DIR", os.path.join(CACHE_ROOT, "mirrors")
+)
+REF_CACHE_TTL_SECONDS = float(os.environ.get("TROWEL_REF_CACHE_TTL", 30))
+REF_CACHE_NEGATIVE_TTL_SECONDS = float(
+    os.environ.get("TROWEL_REF_CACHE_NEGATIVE_TTL", 10)
+)
+
+# time a request may take when there is no lambda context to take it from (server
+# mode), 0 for no deadline. DEADLINE_MARGIN_SECONDS of it are kept for responding
+REQUEST_BUDGET_SECONDS = float(os.environ.get("TROWEL_REQUEST_BUDGET", 60))
+DEADLINE_MARGIN_SECONDS = float(os.environ.get("TROWEL_DEADLINE_MARGIN", 1))
+
+# git commands talking to a remote are stopped after GIT_TIMEOUT_SECONDS. Module
+# clones are hedged: another attempt starts when one has run CLONE_HEDGE_SECONDS,
+# up to CLONE_ATTEMPTS. A cached module moved since it was cached is still served if
+# less than MODULE_FETCH_SECONDS are left for fetching the new commit
+GIT_TIMEOUT_SECONDS = float(os.environ.get("TROWEL_GIT_TIMEOUT", 15))
+CLONE_HEDGE_SECONDS = float(os.environ.get("TROWEL_CLONE_HEDGE", 3))
+CLONE_ATTEMPTS = int(os.environ.get("TROWEL_CLONE_ATTEMPTS", 3))
+MODULE_FETCH_SECONDS = float(os.environ.get("TROWEL_MODULE_FETCH_SECONDS", 5))
@@ -0,0 +1,262 @@
+"""
+Where terraform modules are read from, picked by the syntax of a block's target.
+
+    diggerhq/<name>@<ref>           git repo f"{settings.MODULE_BASE_URL}/<name>"
+    git+<url>[@<ref>]               any git remote, e.g. git+https://host/org/repo.git@main
+    file:///path/to/repo[@<ref>]    local git repo
+    dir:///path/to/module           local directory, read as it is
+    /path/to/module.tar.gz          local tarball (.tar, .tar.gz, .tgz), read as it is
+
+Every source resolves to a revision (the commit sha for git, a content hash for
+directories and tarballs) and reads the module's top level files at that revision,
+so caches keyed by revision treat all of them alike. A local directory or tarball
+lets production point at a pre-fetched mirror and tests run offline at disk speed.
+Anything but diggerhq/<name>@<ref> is code supplied by the caller, each kind has to
+be enabled in settings.MODULE_SOURCES (TROWEL_MODULE_SOURCES=git,file,dir,tar).
+
+Git targets found in the vendored snapshot (settings.VENDOR_DIR, built into the
+image by vendor_modules.py) are read from it without touching the network.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tarfile
+import threading
+
+import module_cache
+import settings
+from exceptions import GitHubError, PayloadValidationException
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+DIGGERHQ_TARGET = r"diggerhq\/([a-zA-Z-_]+)@([a-zA-Z-_/]+)"
+TARBALL_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+
+
+class GitSource:
+    def __init__(self, url, ref=None):
+        # git would take them for options
+        if url.startswith("-") or (ref or "").startswith("-"):
+            raise PayloadValidationException(f"Git repo {url}@{ref} is not valid")
+        self.url = url
+        self.ref = ref
+        self.key = ("git", url, ref)
+
+    def resolve(self):
+        return module_cache.MODULE_CACHE.resolve(self.url, self.ref)
+
+    def read(self, revision=None, cache=None):
+        cache = cache or module_cache.MODULE_CACHE
+        return cache.read(self.url, self.ref, revision)
+
+
+class DirectorySource:
+    def __init__(self, path):
+        self.path = path
+        self.key = ("dir", path)
+
+    def resolve(self):
+        return self.read()[0]
+
+    def read(self, revision=None, cache=None):
+        files = read_dir(self.path)
+        return files_revision(files), files
+
+
+class VendoredSource:
+    """
+    git repo url@ref as vendored into the snapshot at build time, keyed like the
+    GitSource it stands in for
+    """
+
+    def __init__(self, url, ref, sha, path):
+        self.url = url
+        self.ref = ref
+        self.sha = sha
+        self.path = path
+        self.key = ("git", url, ref)
+
+    def resolve(self):
+        return self.sha
+
+    def read(self, revision=None, cache=None):
+        return self.sha, read_dir(self.path)
+
+
+class TarballSource:
+    def __init__(self, path):
+        self.path = path
+        self.key = ("tar", path)
+
+    def resolve(self):
+        return self.read()[0]
+
+    def read(self, revision=None, cache=None):
+        try:
+            with tarfile.open(self.path) as tar:
+                members = [m for m in tar.getmembers() if m.isfile()]
+                root = common_root([m.name for m in members])
+                files = {}
+                for member in members:
+                    name = member.name[len(root) :]
+                    if name and "/" not in name:
+                        files[name] = tar.extractfile(member).read()
+        except (OSError, tarfile.TarError) as e:
+            raise GitHubError(f"Failed to read module tarball {self.path}: {e}")
+        return files_revision(files), files
+
+
+def read_dir(path):
+    """
+    returns contents of the top level files in path by name
+    """
+    if not os.path.isdir(path):
+        raise GitHubError(f"Module directory {path} does not exist")
+    files = {}
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path):
+            with open(file_path, "rb") as f:
+                files[name] = f.read()
+    return files
+
+
+def files_revision(files):
+    """
+    returns hash of file names and contents, the revision of a directory or tarball
+    """
+    digest = hashlib.sha256()
+    for name, content in sorted(files.items()):
+        digest.update(name.encode() + b"\0")
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+def common_root(names):
+    """
+    returns the single top level directory every name is in (with trailing /), "" if there is none
+    """
+    names = [n[2:] if n.startswith("./") else n for n in names]
+    roots = {n.split("/", 1)[0] for n in names}
+    if len(roots) == 1 and all("/" in n for n in names):
+        return roots.pop() + "/"
+    return ""
+
+
+def split_ref(target):
+    """
+    splits url@ref, a url without a ref (git+ssh://git@host/repo.git) is returned as it is
+    """
+    location, sep, ref = target.rpartition("@")
+    if sep and "/" in location.split("://", 1)[-1]:
+        return location, ref
+    return target, None
+
+
+def target_kind(target):
+    """
+    returns which of settings.MODULE_SOURCES target is, "diggerhq" for
+    diggerhq/<name>@<ref>
+    """
+    if target.startswith("dir://"):
+        return "dir"
+    if target.endswith(TARBALL_SUFFIXES):
+        return "tar"
+    if target.startswith("git+"):
+        return "git"
+    if target.startswith("file://"):
+        return "file"
+    return "diggerhq"
+
+
+def parse_target(target):
+    """
+    returns (location, ref) of a module target, location is the repo name for
+    diggerhq/<name>@<ref> targets and the target without its ref otherwise.
+    Modules of other targets are supplied by the caller and rendered as they are,
+    they are only accepted if their kind is in settings.MODULE_SOURCES.
+    :param target:
+    :return:
+    """
+    kind = target_kind(target)
+    if kind != "diggerhq":
+        if kind not in settings.MODULE_SOURCES:
+            raise PayloadValidationException(
+                f"Target {target} is not allowed, only diggerhq/<name>@<ref> "
+                f"modules are enabled"
+            )
+        if kind in ("git", "file"):
+            return split_ref(target)
+        return target, None
+
+    result = re.search(DIGGERHQ_TARGET, target)
+    if result and len(result.groups()) == 2:
+        groups = result.groups()
+        return groups[0], groups[1]
+    raise PayloadValidationException(f"Target {target} is in a wrong format.")
+
+
+def vendored_key(url, ref):
+    return f"{url}@{ref or 'HEAD'}"
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def vendored_modules(vendor_dir):
+    """
+    returns the modules of the snapshot in vendor_dir by vendored_key, read once
+    """
+    with _snapshots_lock:
+        if vendor_dir not in _snapshots:
+            manifest_path = os.path.join(vendor_dir, "manifest.json")
+            try:
+                with open(manifest_path) as fp:
+                    _snapshots[vendor_dir] = json.load(fp)["modules"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("no vendored modules in %s: %s", vendor_dir, e)
+                _snapshots[vendor_dir] = {}
+        return _snapshots[vendor_dir]
+
+
+def vendored_source(url, ref):
+    """
+    returns VendoredSource of url@ref if it's in the snapshot, None otherwise
+    """
+    if not settings.VENDOR_DIR:
+        return None
+    entry = vendored_modules(settings.VENDOR_DIR).get(vendored_key(url, ref))
+    if entry is None:
+        return None
+    path = os.path.join(settings.VENDOR_DIR, entry["path"])
+    return VendoredSource(url, ref, entry["sha"], path)
+
+
+def git_source(url, ref):
+    return vendored_source(url, ref) or GitSource(url, ref)
+
+
+def module_source(location, ref=None, vendored=True):
+    """
+    returns the source of a module parsed with parse_target
+    :param location:
+    :param ref:
+    :param vendored: whether git repos in the vendored snapshot are read from it
+    """
+    if location.startswith("dir://"):
+        return DirectorySource(location[len("dir://") :])
+    if location.endswith(TARBALL_SUFFIXES):
+        if location.startswith("file://"):
+            location = location[len("file://") :]
+        return TarballSource(location)
+    if location.startswith("git+"):
+        url = location[len("git+") :]
+    elif location.startswith("file://"):
+        url = location
+    else:
+        url = f"{settings.MODULE_BASE_URL}/{location}"
+    return git_source(url, ref) if vendored else GitSource(url, ref)
@@ -0,0 +1,109 @@
+"""
+Process-wide jinja environment with compiled template caching.
+
+Every template (root tf_templates and module templates alike) is compiled once per
+distinct content and kept in memory, the compiled bytecode is also stored on disk
+so a fresh process finds it already compiled as long as the cache dir survives.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache
+from jinja2.sandbox import SandboxedEnvironment
+
+import settings
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+def dashify(value, attribute=None):
+    return str(value).replace("_", "-")
+
+
+def underscorify(value, attribute=None):
+    return str(value).replace("-", "_")
+
+
+class TemplateCache:
+    def __init__(self, bytecode_cache_dir=None, max_templates=256):
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+
+        # module templates can come from payloads (see sources.py), don't let them
+        # reach python internals
+        self.environment = SandboxedEnvironment(bytecode_cache=bytecode_cache)
+        self.environment.filters["dashify"] = dashify
+        self.environment.filters["underscorify"] = underscorify
+        self.max_templates = max_templates
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get_template(self, path, source=None):
+        """
+        returns compiled template for the file at path. Templates are cached by file name
+        and content hash, so identical module templates fetched for different requests
+        share one compiled template.
+        :param path:
+        :param source: template content, read from path if not given
+        :return:
+        """
+        if source is None:
+            with open(path) as template_file:
+                source = template_file.read()
+        name = os.path.basename(path)
+        key = (name, hashlib.sha256(source.encode()).hexdigest())
+
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self.hits += 1
+                self._templates.move_to_end(key)
+                return template
+            self.misses += 1
+
+        template = self._compile(name, key[1], source)
+        with self._lock:
+            self._templates[key] = template
+            if len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return template
+
+    def _compile(self, name, content_hash, source):
+        environment = self.environment
+        bytecode_cache = environment.bytecode_cache
+
+        bucket = None
+        code = None
+        if bytecode_cache is not None:
+            # keyed by content hash instead of path, module templates have no stable path
+            bucket = bytecode_cache.get_bucket(environment, name, content_hash, source)
+            code = bucket.code
+
+        if code is None:
+            code = environment.compile(source, name, name)
+            if bucket is not None:
+                bucket.code = code
+                try:
+                    bytecode_cache.set_bucket(bucket)
+                except OSError as err:
+                    logger.warning(
+                        "template cache: failed to store bytecode of %s: %s", name, err
+                    )
+
+        return environment.template_class.from_code(
+            environment, code, environment.make_globals(None)
+        )
+
+
+TEMPLATES = TemplateCache(settings.JINJA_BYTECODE_CACHE_DIR)
@@ -0,0 +1,151 @@
+import os
+import subprocess
+
+import pytest
+
+
+def git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@digger.dev", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_deadline():
+    """
+    keeps the deadline a handler call started from leaking into later tests
+    """
+    import deadline
+
+    yield
+    deadline._deadline.set(None)
+
+
+@pytest.fixture
+def module_repos(tmp_path):
+    """
+    returns a function creating a local git repo under tmp_path/repos/<name>
+    with given files committed to the given branch
+    """
+    repos_dir = tmp_path / "repos"
+
+    def make_repo(name, files, branch="main"):
+        repo_dir = repos_dir / name
+        if not repo_dir.exists():
+            repo_dir.mkdir(parents=True)
+            git(repo_dir, "init", "-q", "-b", branch)
+        else:
+            git(repo_dir, "checkout", "-q", "-B", branch)
+        for file_name, content in files.items():
+            (repo_dir / file_name).write_text(content)
+        git(repo_dir, "add", "-A")
+        git(repo_dir, "commit", "-q", "--allow-empty", "-m", f"update {name}")
+        return str(repo_dir)
+
+    make_repo.base_url = str(repos_dir)
+    return make_repo
+
+
+NETWORK_MODULE = {
+    "vpc.template.tf": 'module "vpc" {\n  name = "{{ name }}"\n}\n',
+    "outputs.tf": 'output "vpc_id" {\n  value = module.vpc.vpc_id\n}\n',
+}
+
+ECS_MODULE = {
+    "service.template.tf": (
+        'resource "aws_ecs_service" "app" {\n'
+        '  name = "{{ aws_app_identifier }}"\n'
+        "  subnets = {{ ecs_subnet_ids }}\n"
+        "}\n"
+        "locals {\n"
+        "  environment = {{ environment_variables }}\n"
+        "  secrets = {{ secrets }}\n"
+        "}\n"
+    ),
+    "variables.tf": 'variable "ecs_cluster_name" {}\n',
+    "README.md": "not copied\n",
+}
+
+RDS_MODULE = {
+    "rds.template.tf": (
+        'resource "aws_db_instance" "db" {\n'
+        '  identifier = "{{ aws_app_identifier }}"\n'
+        "  subnets = {{ subnets }}\n"
+        "  security_groups = {{ security_groups }}\n"
+        "}\n"
+    ),
+}
+
+
+@pytest.fixture
+def offline_modules(module_repos, monkeypatch, tmp_path):
+    """
+    points module fetches at local repos mimicking diggerhq/target-* modules
+    and keeps module cache entries inside tmp_path
+    """
+    import manifests
+    import module_cache
+    import render_cache
+    import result_cache
+    import settings
+    import utils
+
+    module_repos("target-network-module", NETWORK_MODULE)
+    module_repos("target-ecs-module", ECS_MODULE, branch="dev")
+    module_repos("target-rds-module", RDS_MODULE, branch="dev")
+
+    monkeypatch.setattr(settings, "MODULE_BASE_URL", module_repos.base_url)
+    monkeypatch.setattr(
+        module_cache,
+        "MODULE_CACHE",
+        module_cache.ModuleCache(str(tmp_path / "cache"), 1024**3),
+    )
+    monkeypatch.setattr(utils, "MODULE_CACHE", module_cache.MODULE_CACHE)
+    monkeypatch.setattr(utils, "RENDER_CACHE", render_cache.RenderCache())
+    monkeypatch.setattr(utils, "MANIFESTS", manifests.ManifestStore())
+    monkeypatch.setattr(
+        utils, "RESULT_CACHE", result_cache.ResultCache(64 * 1024**2, 300)
+    )
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(__file__)))
+    return module_repos
+
+
+@pytest.fixture
+def payload():
+    return {
+        "target": "diggerhq/tf-module-bundler@master",
+        "aws_region": "us-east-1",
+        "aws_account_id": "123456789012",
+        "id": "test-env-id",
+        "remote_state": "local",
+        "blocks": [
+            {
+                "name": "network",
+                "type": "vpc",
+                "target": "diggerhq/target-network-module@main",
+            },
+            {
+                "name": "backend",
+                "type": "container",
+                "target": "diggerhq/target-ecs-module@dev",
+                "aws_app_identifier": "backend",
+                "environment_variables": [{"key": "DEBUG", "value": "false"}],
+            },
+            {
+                "name": "worker",
+                "type": "container",
+                "target": "diggerhq/target-ecs-module@dev",
+                "aws_app_identifier": "worker",
+            },
+            {
+                "name": "db",
+                "type": "resource",
+                "target": "diggerhq/target-resource-module@main",
+                "aws_app_identifier": "db",
+                "resource_type": "database",
+            },
+        ],
+    }
@@ -0,0 +1,49 @@
+import base64
+import io
+import zipfile
+
+from archive import archive_etag, build_zip, encode_zip, etag_matches
+from output_tree import OutputTree
+
+
+def make_tree():
+    tree = OutputTree()
+    tree.write("main.tf", "a = 1\n" * 1000)
+    tree.write("app/service.tf", "b = 2\n")
+    return tree
+
+
+class TestArchive:
+    def test_round_trip(self):
+        encoded = encode_zip(make_tree())
+
+        assert b"\n" not in encoded
+        archive = zipfile.ZipFile(io.BytesIO(base64.b64decode(encoded)))
+        assert archive.namelist() == ["app/service.tf", "main.tf"]
+        assert archive.read("main.tf") == b"a = 1\n" * 1000
+
+    def test_compression_level(self):
+        stored = build_zip(make_tree(), compresslevel=0).getvalue()
+        compressed = build_zip(make_tree(), compresslevel=9).getvalue()
+
+        assert len(compressed) < len(stored)
+        info = zipfile.ZipFile(io.BytesIO(stored)).getinfo("main.tf")
+        assert info.compress_type == zipfile.ZIP_STORED
+
+    def test_archives_are_reproducible(self):
+        first = build_zip(make_tree()).getvalue()
+        second = build_zip(make_tree()).getvalue()
+
+        assert first == second
+        info = zipfile.ZipFile(io.BytesIO(first)).getinfo("main.tf")
+        assert info.date_time == (1980, 1, 1, 0, 0, 0)
+        assert info.external_attr >> 16 == 0o100644
+
+    def test_etag_matches(self):
+        etag = archive_etag(build_zip(make_tree()))
+
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"other"', etag)
+        assert not etag_matches(None, etag)
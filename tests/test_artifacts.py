@@ -0,0 +1,80 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+import settings
+from artifacts import LocalDirectoryStore, S3Store, store_bundle, store_from_url
+from exceptions import ArtifactStoreError
+from output_tree import OutputTree
+from utils import generate_terraform_project
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            error = Exception("Not Found")
+            error.response = {"Error": {"Code": "404"}}
+            raise error
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body.read()
+
+
+class TestArtifactStores:
+    def test_store_from_url(self, tmp_path):
+        s3 = store_from_url("s3://bundles-bucket/trowel/")
+        assert (s3.bucket, s3.prefix) == ("bundles-bucket", "trowel")
+        local = store_from_url(f"file://{tmp_path}")
+        assert isinstance(local, LocalDirectoryStore)
+        assert local.root == str(tmp_path)
+
+    def test_identical_trees_are_stored_once(self, tmp_path):
+        store = LocalDirectoryStore(str(tmp_path))
+        tree = OutputTree()
+        tree.write("main.tf", "a = 1\n")
+
+        first = store_bundle(tree, store=store)
+        second = store_bundle(tree, store=store)
+
+        assert first["key"] == second["key"]
+        assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+        assert first["size"] == second["size"]
+        archive = zipfile.ZipFile(io.BytesIO(store.get(first["key"])))
+        assert archive.read("main.tf") == b"a = 1\n"
+
+    def test_s3_store(self):
+        client = FakeS3Client()
+        store = S3Store("bundles-bucket", "trowel", client=client)
+        tree = OutputTree()
+        tree.write("main.tf", "a = 1\n")
+
+        bundle = store_bundle(tree, store=store)
+
+        assert ("bundles-bucket", f"trowel/{bundle['key']}") in client.objects
+        assert store_bundle(tree, store=store)["deduplicated"]
+
+    def test_missing_store_configuration(self, monkeypatch):
+        monkeypatch.setattr(settings, "ARTIFACT_STORE_URL", None)
+
+        with pytest.raises(ArtifactStoreError):
+            store_bundle(OutputTree())
+
+
+class TestReferenceOutput:
+    def test_returns_key_and_size(
+        self, offline_modules, payload, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "ARTIFACT_STORE_URL", str(tmp_path / "store"))
+        payload["output_mode"] = "reference"
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        body = json.loads(result["body"])
+        assert set(body) == {"key", "size"}
+        assert (tmp_path / "store" / body["key"]).stat().st_size == body["size"]
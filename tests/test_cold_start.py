@@ -0,0 +1,69 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cumulative time of `import handler` reported by -X importtime
+HANDLER_IMPORT_BUDGET_US = 75_000
+# packages installed into the lambda image by `poetry install --only main`
+RUNTIME_PACKAGES_BUDGET = 12
+# loaded on first use, not when the lambda runtime imports the handler
+LAZY_MODULES = ("pydantic", "jinja2", "payloads", "utils")
+
+
+def import_handler(code=""):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import handler{code}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def runtime_packages():
+    try:
+        import tomllib
+    except ImportError:
+        # before python 3.11, skips only this test instead of the whole module
+        tomllib = pytest.importorskip("tomli")
+
+    with open(os.path.join(ROOT, "pyproject.toml"), "rb") as fp:
+        dependencies = tomllib.load(fp)["tool"]["poetry"]["dependencies"]
+    with open(os.path.join(ROOT, "poetry.lock"), "rb") as fp:
+        locked = {p["name"].lower(): p for p in tomllib.load(fp)["package"]}
+
+    installed = set()
+    pending = [name for name in dependencies if name != "python"]
+    while pending:
+        name = pending.pop().lower().replace("_", "-")
+        if name not in installed:
+            installed.add(name)
+            pending += list(locked[name].get("dependencies", {}))
+    return installed
+
+
+class TestColdStart:
+    def test_heavy_modules_are_not_imported_with_handler(self):
+        result = import_handler(
+            f"; import sys; print([m for m in {LAZY_MODULES!r} if m in sys.modules])"
+        )
+
+        assert result.stdout.strip() == "[]"
+
+    def test_handler_import_time(self):
+        stderr = import_handler().stderr
+        # last line is the handler itself: "import time: self | cumulative | handler"
+        cumulative = int(re.findall(r"\|\s*(\d+)\s*\|\s*handler$", stderr, re.M)[-1])
+
+        assert cumulative < HANDLER_IMPORT_BUDGET_US
+
+    def test_runtime_package_count(self):
+        packages = runtime_packages()
+
+        assert "terraform-compliance" not in packages
+        assert len(packages) <= RUNTIME_PACKAGES_BUDGET, sorted(packages)
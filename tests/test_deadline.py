@@ -0,0 +1,189 @@
+import copy
+import subprocess
+import time
+
+import pytest
+
+import deadline
+import module_cache
+import settings
+from exceptions import DeadlineExceeded, GitHubError, RefNotFoundError
+from handler import generate_terraform
+from module_cache import ModuleCache
+
+from .conftest import git
+
+
+class LambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class TestDeadline:
+    def test_budget(self, monkeypatch):
+        monkeypatch.setattr(settings, "REQUEST_BUDGET_SECONDS", 30)
+
+        assert deadline.budget(LambdaContext(20000)) == 20
+        assert deadline.budget(None) == 30
+        monkeypatch.setattr(settings, "REQUEST_BUDGET_SECONDS", 0)
+        assert deadline.budget(None) is None
+
+    def test_margin_is_kept(self, monkeypatch):
+        monkeypatch.setattr(settings, "DEADLINE_MARGIN_SECONDS", 1)
+
+        assert deadline.start(LambdaContext(20000)) == 19
+        assert 18.9 < deadline.remaining() <= 19
+        assert deadline.has(10)
+        assert not deadline.has(20)
+
+    def test_subprocess_is_stopped_at_deadline(self, monkeypatch):
+        monkeypatch.setattr(settings, "DEADLINE_MARGIN_SECONDS", 0)
+        deadline.start(LambdaContext(300))
+        started = time.monotonic()
+
+        with pytest.raises(DeadlineExceeded):
+            deadline.run(["sleep", "5"])
+        assert time.monotonic() - started < 2
+        with pytest.raises(DeadlineExceeded):
+            deadline.run(["true"])
+
+    def test_subprocess_timeout(self):
+        with pytest.raises(subprocess.TimeoutExpired):
+            deadline.run(["sleep", "5"], timeout_seconds=0.2)
+        assert deadline.run(["echo", "ok"]).stdout == b"ok\n"
+        with pytest.raises(subprocess.CalledProcessError):
+            deadline.run(["false"])
+
+    def test_reserve(self, monkeypatch):
+        monkeypatch.setattr(settings, "DEADLINE_MARGIN_SECONDS", 0)
+        deadline.start(LambdaContext(10000))
+
+        with deadline.reserve(4):
+            assert 5.9 < deadline.remaining() <= 6
+        assert deadline.remaining() > 9.9
+
+    def test_input_to_slow_subprocess(self):
+        result = deadline.run(["sh", "-c", "sleep 0.3; cat"], input=b"hello")
+
+        assert result.stdout == b"hello"
+
+
+class TestHedged:
+    def test_stalled_attempt_is_hedged(self):
+        calls = []
+
+        def attempt(cancel):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                deadline.run(["sleep", "5"], cancel=cancel)
+            return len(calls)
+
+        started = time.monotonic()
+        assert deadline.hedged(attempt, attempts=3, hedge_after=0.2) == 2
+        # the first attempt was cancelled, not waited for
+        assert time.monotonic() - started < 2
+
+    def test_timed_out_attempt_is_retried(self):
+        calls = []
+
+        def attempt(cancel):
+            calls.append(1)
+            if len(calls) < 3:
+                deadline.run(["sleep", "5"], timeout_seconds=0.1, cancel=cancel)
+            return "done"
+
+        assert deadline.hedged(attempt, attempts=3, hedge_after=10) == "done"
+        assert len(calls) == 3
+
+    def test_last_timeout_is_raised(self):
+        def attempt(cancel):
+            deadline.run(["sleep", "5"], timeout_seconds=0.1, cancel=cancel)
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            deadline.hedged(attempt, attempts=2, hedge_after=10)
+
+    def test_errors_are_not_retried(self):
+        calls = []
+
+        def attempt(cancel):
+            calls.append(1)
+            deadline.run(["false"])
+
+        with pytest.raises(subprocess.CalledProcessError):
+            deadline.hedged(attempt, attempts=3, hedge_after=10)
+        assert len(calls) == 1
+
+
+class TestStaleModules:
+    def test_served_when_ref_cant_be_resolved(
+        self, tmp_path, module_repos, monkeypatch
+    ):
+        url = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        cache = ModuleCache(str(tmp_path / "cache"), 1024**3)
+        sha, _ = cache.read(url, "main")
+
+        def unreachable(url, ref):
+            raise GitHubError("Timed out resolving")
+
+        monkeypatch.setattr(module_cache, "resolve_ref", unreachable)
+
+        assert cache.resolve(url, "main") == sha
+        assert cache.stats()["stale"] == 1
+        with pytest.raises(GitHubError):
+            cache.resolve(url, "other")
+
+    def test_served_when_resolve_stalls(self, tmp_path, module_repos, monkeypatch):
+        url = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        cache = ModuleCache(str(tmp_path / "cache"), 1024**3)
+        sha, _ = cache.read(url, "main")
+
+        def hanging(url, ref):
+            deadline.run(["sleep", "10"], timeout_seconds=settings.GIT_TIMEOUT_SECONDS)
+
+        monkeypatch.setattr(module_cache, "resolve_ref", hanging)
+        monkeypatch.setattr(settings, "DEADLINE_MARGIN_SECONDS", 0)
+        monkeypatch.setattr(settings, "MODULE_FETCH_SECONDS", 2)
+        deadline.start(LambdaContext(3000))
+
+        assert cache.resolve(url, "main") == sha
+        # the fetch time was left over for the rest of the request
+        assert deadline.remaining() > 1.5
+        assert cache.stats()["stale"] == 1
+
+    def test_missing_ref_is_not_masked(self, tmp_path, module_repos):
+        url = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        cache = ModuleCache(str(tmp_path / "cache"), 1024**3)
+        cache.read(url, "main")
+        git(url, "branch", "-q", "-m", "main", "renamed")
+
+        with pytest.raises(RefNotFoundError):
+            cache.resolve(url, "main")
+
+    def test_served_when_fetch_would_miss_deadline(
+        self, tmp_path, module_repos, monkeypatch
+    ):
+        url = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        cache = ModuleCache(str(tmp_path / "cache"), 1024**3)
+        sha, _ = cache.read(url, "main")
+        module_repos("target-ecs-module", {"main.tf": "a = 2\n"})
+        monkeypatch.setattr(settings, "MODULE_FETCH_SECONDS", 5)
+
+        assert cache.resolve(url, "main") != sha
+        deadline.start(LambdaContext(4000))
+        assert cache.resolve(url, "main") == sha
+        assert cache.read(url, "main", cache.resolve(url, "main"))[1] == {
+            "main.tf": b"a = 1\n"
+        }
+
+
+class TestHandlerDeadline:
+    def test_out_of_time_is_a_timeout_error(self, offline_modules, payload):
+        payload["cache"] = False
+
+        response = generate_terraform(copy.deepcopy(payload), LambdaContext(500))
+
+        assert response["statusCode"] == 504
+        assert "deadline exceeded" in response["error"]
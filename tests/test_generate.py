@@ -0,0 +1,424 @@
+import base64
+import copy
+import io
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import module_cache
+import settings
+import utils
+from manifests import ManifestStore
+from render_cache import RenderCache
+from utils import generate_terraform_batch, generate_terraform_project
+
+from .conftest import ECS_MODULE
+
+
+def unzip(result):
+    archive = zipfile.ZipFile(io.BytesIO(base64.b64decode(result["body"])))
+    return {
+        name: archive.read(name)
+        for name in archive.namelist()
+        if not name.endswith("/")
+    }
+
+
+class TestGenerateTerraformProject:
+    def test_generates_all_blocks(self, offline_modules, payload, tmp_path):
+        result = generate_terraform_project(
+            str(tmp_path / "out"), "tf_templates/", payload
+        )
+
+        assert result["statusCode"] == 200
+        files = unzip(result)
+        assert b'name    = "backend"' in files["backend/service.tf"]
+        assert b'name    = "worker"' in files["worker/service.tf"]
+        assert "backend/variables.tf" in files
+        assert "backend/README.md" not in files
+        assert "backend/ecs_task_policy.json" in files
+        assert b"module.network.private_subnets" in files["db/rds.tf"]
+        assert "main.tf" in files
+
+    def test_module_is_fetched_once_per_request(
+        self, offline_modules, payload, tmp_path
+    ):
+        payload["blocks"] += [
+            {
+                "name": f"app-{i}",
+                "type": "container",
+                "target": "diggerhq/target-ecs-module@dev",
+                "aws_app_identifier": f"app-{i}",
+            }
+            for i in range(5)
+        ]
+
+        generate_terraform_project(str(tmp_path / "out"), "tf_templates/", payload)
+
+        # network, ecs and rds modules, regardless of how many blocks use them
+        assert module_cache.MODULE_CACHE.stats()["misses"] == 3
+        assert module_cache.MODULE_CACHE.stats()["hits"] == 0
+
+    def test_generates_in_memory(self, offline_modules, payload, tmp_path, monkeypatch):
+        # warm up the module cache, filling it clones into a temp dir
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+
+        def mkdtemp(*args, **kwargs):
+            raise AssertionError("no temp dirs should be needed")
+
+        monkeypatch.setattr(tempfile, "mkdtemp", mkdtemp)
+        payload["cache"] = False
+        files = unzip(generate_terraform_project(None, "tf_templates/", payload))
+
+        assert b'name    = "backend"' in files["backend/service.tf"]
+        assert files[".digger"] == b"ENVIRONMENT_ID=test-env-id"
+        assert "README.md" in files
+
+    def test_project_dir_gets_a_copy_of_the_bundle(
+        self, offline_modules, payload, tmp_path
+    ):
+        files = unzip(
+            generate_terraform_project(str(tmp_path / "out"), "tf_templates/", payload)
+        )
+
+        terraform_dir = tmp_path / "out" / "terraform"
+        for name, content in files.items():
+            assert (terraform_dir / name).read_bytes() == content
+
+    def test_parallel_output_matches_serial(
+        self, offline_modules, payload, tmp_path, monkeypatch
+    ):
+        payload["blocks"] += [
+            {
+                "name": f"app-{i}",
+                "type": "container",
+                "target": "diggerhq/target-ecs-module@dev",
+                "aws_app_identifier": f"app-{i}",
+                "shared_terraform_module": True,
+                "shared_terraform_module_name": "shared-app",
+            }
+            for i in range(4)
+        ]
+
+        run_tasks = utils.run_tasks
+        workers = []
+
+        def spy_run_tasks(tasks, dependencies, max_workers=1):
+            workers.append(max_workers)
+            return run_tasks(tasks, dependencies, max_workers=max_workers)
+
+        monkeypatch.setattr(utils, "run_tasks", spy_run_tasks)
+        payload["cache"] = False
+
+        serial = generate_terraform_project(
+            str(tmp_path / "serial"), "tf_templates/", copy.deepcopy(payload)
+        )
+        # rendered again, in parallel this time
+        monkeypatch.setattr(utils, "RENDER_CACHE", RenderCache())
+        payload.update({"parallel": True, "max_workers": 4})
+        parallel = generate_terraform_project(
+            str(tmp_path / "parallel"), "tf_templates/", payload
+        )
+
+        assert workers == [1, 4]
+        assert utils.RENDER_CACHE.stats()["hits"] == 0
+        assert unzip(parallel) == unzip(serial)
+        assert b'name    = "app-3"' in unzip(parallel)["shared-app/service.tf"]
+
+    def test_max_workers_is_capped(
+        self, offline_modules, payload, tmp_path, monkeypatch
+    ):
+        run_tasks = utils.run_tasks
+        workers = []
+
+        def spy_run_tasks(tasks, dependencies, max_workers=1):
+            workers.append(max_workers)
+            return run_tasks(tasks, dependencies, max_workers=max_workers)
+
+        monkeypatch.setattr(utils, "run_tasks", spy_run_tasks)
+        monkeypatch.setattr(settings, "MAX_WORKERS", 2)
+        payload.update({"parallel": True, "max_workers": 64, "cache": False})
+
+        generate_terraform_project(str(tmp_path / "out"), "tf_templates/", payload)
+
+        assert workers == [2]
+
+    def test_project_is_formatted_once(
+        self, offline_modules, payload, tmp_path, monkeypatch
+    ):
+        calls = []
+        format_generated_terraform = utils.format_generated_terraform
+
+        def record(tree):
+            calls.append(tree.paths())
+            format_generated_terraform(tree)
+
+        monkeypatch.setattr(utils, "format_generated_terraform", record)
+        custom_terraform = 'resource "null_resource" "cluster" {\n\n}\n'
+        payload["blocks"].append(
+            {
+                "name": "legacy",
+                "type": "imported",
+                "target": "diggerhq/imported@main",
+                "custom_terraform": base64.b64encode(custom_terraform.encode()),
+            }
+        )
+
+        files = unzip(
+            generate_terraform_project(str(tmp_path / "out"), "tf_templates/", payload)
+        )
+
+        # once, before imported blocks are added
+        assert len(calls) == 1
+        assert "legacy/overrides.tf" not in calls[0]
+        # custom terraform is kept as it is
+        assert files["legacy/overrides.tf"] == custom_terraform.encode()
+        assert b"\n\n\n" not in files["backend/service.tf"]
+
+
+class TestRenderCache:
+    def test_unchanged_blocks_are_not_rebuilt(self, offline_modules, payload, tmp_path):
+        first = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+        payload["cache"] = False
+        second = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+
+        assert first["rebuilt_blocks"] == ["network", "backend", "worker", "db"]
+        assert second["rebuilt_blocks"] == []
+        assert unzip(second) == unzip(first)
+        # nothing had to be read from the module cache the second time
+        assert module_cache.MODULE_CACHE.stats()["hits"] == 0
+
+    def test_changed_block_is_rebuilt(self, offline_modules, payload):
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        payload["blocks"][1]["environment_variables"][0]["value"] = "true"
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        assert result["rebuilt_blocks"] == ["backend"]
+        assert b'"value" : "true"' in unzip(result)["backend/service.tf"]
+
+    def test_module_change_rebuilds_its_blocks(self, offline_modules, payload):
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        ecs_module = dict(ECS_MODULE, **{"extra.tf": "locals {}\n"})
+        offline_modules("target-ecs-module", ecs_module, branch="dev")
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        assert result["rebuilt_blocks"] == ["backend", "worker"]
+        assert "worker/extra.tf" in unzip(result)
+
+
+class TestConcurrency:
+    def test_concurrent_projects_match_serial(
+        self, offline_modules, payload, monkeypatch
+    ):
+        monkeypatch.setattr(utils, "RENDER_CACHE", RenderCache(max_entries=0))
+        payloads = []
+        for i in range(6):
+            p = copy.deepcopy(payload)
+            p.update({"id": f"env-{i}", "cache": False, "tags": {"env": f"env-{i}"}})
+            p["blocks"][1]["environment_variables"][0]["value"] = str(i)
+            if i % 2:
+                p["namespace"] = f"ns{i}"
+                p["parallel"] = True
+            payloads.append(p)
+        originals = copy.deepcopy(payloads)
+
+        serial = [
+            unzip(generate_terraform_project(None, "tf_templates/", p))
+            for p in payloads
+        ]
+        with ThreadPoolExecutor(max_workers=len(payloads)) as pool:
+            results = list(
+                pool.map(
+                    lambda p: generate_terraform_project(None, "tf_templates/", p),
+                    payloads * 3,
+                )
+            )
+
+        assert [unzip(r) for r in results] == serial * 3
+        assert payloads == originals
+        assert "ns1/service.tf" not in serial[1]
+        assert "backend-ns1/service.tf" in serial[1]
+
+
+class TestBatch:
+    def test_environments_share_checkouts(self, offline_modules, payload, monkeypatch):
+        resolved = []
+        resolve_ref = module_cache.resolve_ref
+
+        def record(url, ref):
+            resolved.append((url, ref))
+            return resolve_ref(url, ref)
+
+        monkeypatch.setattr(module_cache, "resolve_ref", record)
+        environments = [
+            (name, dict(copy.deepcopy(payload), namespace=name))
+            for name in ("dev", "qa", "prod")
+        ]
+
+        result = generate_terraform_batch("tf_templates/", environments)
+
+        assert result["statusCode"] == 200
+        assert [e["name"] for e in result["environments"]] == ["dev", "qa", "prod"]
+        prod = unzip(result["environments"][2])
+        assert b'name    = "backend-prod"' in prod["backend-prod/service.tf"]
+        # network, ecs and rds modules, once for the whole batch
+        assert len(resolved) == len(set(resolved)) == 3
+
+    def test_failing_environment_does_not_fail_the_others(
+        self, offline_modules, payload
+    ):
+        broken = dict(copy.deepcopy(payload), datadog_enabled=True)
+
+        result = generate_terraform_batch(
+            "tf_templates/", [("dev", payload), ("broken", broken)]
+        )
+
+        assert result["statusCode"] == 500
+        dev, broken = result["environments"]
+        assert dev["statusCode"] == 200 and dev["body"]
+        assert broken["statusCode"] == 500
+        assert "DATADOG_KEY" in broken["error"]
+
+    def test_unexpected_error_does_not_fail_the_others(self, offline_modules, payload):
+        # process_tf_templates raises ValueError, not a LambdaError
+        broken = dict(copy.deepcopy(payload), api_gateway=True)
+
+        result = generate_terraform_batch(
+            "tf_templates/", [("dev", payload), ("broken", broken)]
+        )
+
+        dev, broken = result["environments"]
+        assert dev["statusCode"] == 200 and dev["body"]
+        assert broken["statusCode"] == 500 and broken["error"]
+
+
+class TestTimings:
+    def test_timings_are_returned_on_request(self, offline_modules, payload):
+        assert "timings" not in generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+        payload.update({"include_timings": True, "cache": False})
+
+        timings = generate_terraform_project(None, "tf_templates/", payload)["timings"]
+
+        assert {"blocks", "format", "archive"} <= set(timings["stages"])
+        assert timings["stages"]["block"]["count"] == 4
+        assert "resolve" in timings["blocks"]["backend"]
+        assert timings["counters"]["render_cache_hits"] == 4
+
+
+class TestResultCache:
+    def test_same_payload_is_served_from_cache(self, offline_modules, payload):
+        first = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+        second = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+
+        assert second["body"] == first["body"]
+        assert second["rebuilt_blocks"] == []
+        assert utils.RESULT_CACHE.stats()["hits"] == 1
+        # no block was looked at
+        assert utils.RENDER_CACHE.stats() == {"hits": 0, "misses": 4}
+
+    def test_module_change_misses(self, offline_modules, payload):
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        ecs_module = dict(ECS_MODULE, **{"extra.tf": "locals {}\n"})
+        offline_modules("target-ecs-module", ecs_module, branch="dev")
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        assert utils.RESULT_CACHE.stats()["hits"] == 0
+        assert "worker/extra.tf" in unzip(result)
+
+    def test_response_options_share_an_entry(self, offline_modules, payload):
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        payload.update({"parallel": True, "compression_level": 0})
+
+        generate_terraform_project(None, "tf_templates/", payload)
+
+        assert utils.RESULT_CACHE.stats()["hits"] == 1
+
+    def test_formatter_change_misses(self, offline_modules, payload, monkeypatch):
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        monkeypatch.setattr(settings, "HCL_FORMATTER", "terraform")
+        monkeypatch.setattr(utils, "terraform_format", lambda *args, **kwargs: None)
+
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+
+        assert utils.RESULT_CACHE.stats()["hits"] == 0
+
+    def test_bypass(self, offline_modules, payload):
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        payload["cache"] = False
+
+        generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+
+        assert utils.RESULT_CACHE.stats()["hits"] == 0
+        assert utils.RENDER_CACHE.stats()["hits"] == 4
+
+
+class TestDeltaBundle:
+    def test_only_changed_files_are_sent(self, offline_modules, payload):
+        base = generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        payload["blocks"][1]["environment_variables"][0]["value"] = "true"
+        payload["blocks"] = [b for b in payload["blocks"] if b["name"] != "worker"]
+        payload["base_manifest"] = base["manifest_digest"]
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        delta = result["delta"]
+        assert delta["base"] == base["manifest_digest"]
+        assert delta["added"] == []
+        assert "backend/service.tf" in delta["changed"]
+        assert "worker/service.tf" in delta["deleted"]
+        assert set(unzip(result)) == set(delta["changed"])
+        assert result["manifest_digest"] != base["manifest_digest"]
+        assert "backend/service.tf" in result["manifest"]
+
+    def test_unknown_base_gets_full_bundle(self, offline_modules, payload):
+        payload["base_manifest"] = "0" * 64
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        assert "delta" not in result
+        assert "main.tf" in unzip(result)
+
+    def test_manifests_survive_a_new_process(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "ARTIFACT_STORE_URL", str(tmp_path / "store"))
+        ManifestStore().put("a" * 64, {"main.tf": "1234"})
+
+        assert ManifestStore().get("a" * 64) == {"main.tf": "1234"}
+        assert ManifestStore().get("b" * 64) is None
+
+
+class TestNotModified:
+    def test_same_project_gets_same_etag(self, offline_modules, payload):
+        first = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+        second = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+
+        assert first["body"] == second["body"]
+        assert first["headers"]["ETag"] == second["headers"]["ETag"]
+
+    def test_matching_etag_gets_no_body(self, offline_modules, payload):
+        first = generate_terraform_project(
+            None, "tf_templates/", copy.deepcopy(payload)
+        )
+        payload["if_none_match"] = first["headers"]["ETag"]
+
+        result = generate_terraform_project(None, "tf_templates/", payload)
+
+        assert result["statusCode"] == 304
+        assert "body" not in result
+        assert result["headers"]["ETag"] == first["headers"]["ETag"]
@@ -1,6 +1,23 @@
+import base64
+import io
 import json
+import zipfile
+
 import pytest
-from handler import generate_terraform
+
+import settings
+from handler import generate_terraform, generate_terraform_batch
+
+
+def url_event(payload, headers=None):
+    """
+    event of a function URL invocation
+    """
+    return {
+        "body": json.dumps(payload),
+        "headers": headers or {},
+        "requestContext": {"http": {"method": "POST"}},
+    }
 
 
 class TestLambdaPayloads:
@@ -8,3 +25,66 @@ class TestLambdaPayloads:
         response = generate_terraform({}, None)
         assert response["statusCode"] == 500
         assert "blocks" in response["error"]
+
+
+class TestFunctionUrl:
+    def test_batch_results_are_in_body(self, offline_modules, payload, monkeypatch):
+        monkeypatch.setattr(settings, "TF_TEMPLATES_DIR", "tf_templates/")
+        batch = {"base": payload, "environments": {"dev": {}, "qa": {}}}
+
+        response = generate_terraform_batch(url_event(batch), None)
+
+        assert set(response) == {"statusCode", "headers", "body"}
+        environments = json.loads(response["body"])["environments"]
+        assert [e["name"] for e in environments] == ["dev", "qa"]
+        archive = zipfile.ZipFile(io.BytesIO(base64.b64decode(environments[0]["body"])))
+        assert "main.tf" in archive.namelist()
+
+    def test_metadata_is_in_headers(self, offline_modules, payload, monkeypatch):
+        monkeypatch.setattr(settings, "TF_TEMPLATES_DIR", "tf_templates/")
+
+        response = generate_terraform(url_event(payload), None)
+
+        assert set(response) == {"statusCode", "headers", "body"}
+        headers = response["headers"]
+        assert len(headers["X-Trowel-Manifest-Digest"]) == 64
+        assert json.loads(headers["X-Trowel-Rebuilt-Blocks"])
+        # the bundle itself, not a json envelope
+        zipfile.ZipFile(io.BytesIO(base64.b64decode(response["body"])))
+
+    def test_delta_and_manifest_are_in_body(
+        self, offline_modules, payload, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "TF_TEMPLATES_DIR", "tf_templates/")
+        first = generate_terraform(url_event(payload), None)
+        digest = first["headers"]["X-Trowel-Manifest-Digest"]
+        payload.update({"base_manifest": digest, "include_timings": True})
+        payload["blocks"][1]["aws_app_identifier"] = "changed"
+
+        response = generate_terraform(url_event(payload), None)
+
+        headers = response["headers"]
+        assert json.loads(headers["X-Trowel-Rebuilt-Blocks"]) == ["backend"]
+        assert headers["X-Trowel-Manifest-Digest"] != digest
+        assert not any(
+            name in headers
+            for name in ("X-Trowel-Delta", "X-Trowel-Manifest", "X-Trowel-Timings")
+        )
+        assert headers["Content-Type"] == "application/json"
+        body = json.loads(response["body"])
+        assert body["delta"]["base"] == digest and "deleted" in body["delta"]
+        assert body["manifest"]
+        assert "total_ms" in body["timings"]
+        zipfile.ZipFile(io.BytesIO(base64.b64decode(body["body"])))
+
+    def test_error_is_in_body(self):
+        response = generate_terraform(url_event({}), None)
+
+        assert response["statusCode"] == 500
+        assert "blocks" in json.loads(response["body"])["error"]
+
+    def test_malformed_body(self):
+        response = generate_terraform({**url_event({}), "body": "{not json"}, None)
+
+        assert response["statusCode"] == 400
+        assert "not valid JSON" in json.loads(response["body"])["error"]
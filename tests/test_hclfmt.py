@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import settings
+import utils
+from exceptions import HclFormatError
+from hclfmt import format_hcl
+from output_tree import OutputTree
+from utils import generate_terraform_project
+
+from .test_generate import unzip
+
+TEST_CONFIGS_DIR = os.path.join(os.path.dirname(__file__), "..", "test_configs")
+TEST_CONFIGS = [
+    os.path.join(TEST_CONFIGS_DIR, "hubii.json"),
+    os.path.join(TEST_CONFIGS_DIR, "test.json"),
+    # kept failing so it shows up once the config is migrated, drop the mark then
+    pytest.param(
+        os.path.join(TEST_CONFIGS_DIR, "digger.json"),
+        marks=pytest.mark.xfail(
+            raises=TypeError,
+            strict=True,
+            reason="digger.json lists secrets as plain strings, which the "
+            "generator no longer accepts",
+        ),
+    ),
+]
+
+
+class TestFormatHcl:
+    def test_aligns_equals_of_consecutive_attributes(self):
+        source = (
+            'resource "aws_instance" "web" {\n'
+            '    ami="ami-123"\n'
+            "  instance_type   =  var.type\n"
+            "  tags = {\n"
+            '  Name = "web"\n'
+            "  }\n"
+            "}\n"
+        )
+
+        assert format_hcl(source) == (
+            'resource "aws_instance" "web" {\n'
+            '  ami           = "ami-123"\n'
+            "  instance_type = var.type\n"
+            "  tags = {\n"
+            '    Name = "web"\n'
+            "  }\n"
+            "}\n"
+        )
+
+    def test_spacing(self):
+        source = (
+            "locals {\n"
+            "  a = length( var.list )-1\n"
+            "  b = [ 1,2,-3 ]\n"
+            "  c = !var.enabled ? var.x[ 0 ] : aws_instance.web.*.id\n"
+            "  d = [for s in var.list : upper(s)]\n"
+            "  e = {}\n"
+            "}\n"
+        )
+
+        assert format_hcl(source) == (
+            "locals {\n"
+            "  a = length(var.list) - 1\n"
+            "  b = [1, 2, -3]\n"
+            "  c = !var.enabled ? var.x[0] : aws_instance.web.*.id\n"
+            "  d = [for s in var.list : upper(s)]\n"
+            "  e = {}\n"
+            "}\n"
+        )
+
+    def test_unwraps_interpolation_only_attributes(self):
+        source = (
+            'module "app" {\n'
+            '  name = "${var.name}"\n'
+            '  url = "${var.host}:${var.port}"\n'
+            "  tags = {\n"
+            '    Name = "${var.name}"\n'
+            "  }\n"
+            "}\n"
+        )
+
+        assert format_hcl(source) == (
+            'module "app" {\n'
+            "  name = var.name\n"
+            '  url  = "${var.host}:${var.port}"\n'
+            "  tags = {\n"
+            '    Name = "${var.name}"\n'
+            "  }\n"
+            "}\n"
+        )
+
+    def test_normalizes_legacy_variable_types(self):
+        source = (
+            'variable "a" {\n  type = "string"\n}\n'
+            'variable "b" {\n  type = list\n}\n'
+            'variable "c" {\n  type = "map"\n}\n'
+        )
+
+        assert format_hcl(source) == (
+            'variable "a" {\n  type = string\n}\n'
+            'variable "b" {\n  type = list(any)\n}\n'
+            'variable "c" {\n  type = map(string)\n}\n'
+        )
+
+    def test_aligns_trailing_comments(self):
+        source = "locals {\n  a = 1 # one\n  long = 2 # two\n}\n"
+
+        assert format_hcl(source) == (
+            "locals {\n  a    = 1 # one\n  long = 2 # two\n}\n"
+        )
+
+    def test_keeps_heredoc_bodies(self):
+        source = (
+            'resource "aws_iam_policy" "p" {\n'
+            "policy = <<EOF\n"
+            '{   "Version": "2012-10-17"  }\n'
+            "    EOF\n"
+            "}\n"
+        )
+
+        assert format_hcl(source) == (
+            'resource "aws_iam_policy" "p" {\n'
+            "  policy = <<EOF\n"
+            '{   "Version": "2012-10-17"  }\n'
+            "    EOF\n"
+            "}\n"
+        )
+
+    def test_normalizes_blank_lines(self):
+        source = "\n\nlocals {\n  a = 1   \n\n   \n\n  b = 2\n}\n\n\n"
+
+        assert format_hcl(source) == "locals {\n  a = 1\n\n  b = 2\n}\n"
+
+    def test_unterminated_string_is_an_error(self):
+        with pytest.raises(HclFormatError):
+            format_hcl('locals {\n  a = "oops\n}\n')
+
+
+class TestFormatGeneratedTerraform:
+    def test_falls_back_to_terraform_fmt(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            utils,
+            "terraform_format",
+            lambda path=".", recursive=False: calls.append(recursive),
+        )
+        tree = OutputTree()
+        tree.write("app/main.tf", "/* multi\nline */\nlocals {}\n")
+        tree.write("app/policy.json", "{\n\n}")
+
+        utils.format_generated_terraform(tree)
+
+        assert calls == [True]
+        assert tree.read("app/main.tf") == b"/* multi\nline */\nlocals {}\n"
+        assert tree.read("app/policy.json") == b"{\n\n}"
+
+
+@pytest.fixture
+def test_config_modules(offline_modules):
+    """
+    module repos and branches referenced by test_configs/*.json
+    """
+    from .conftest import ECS_MODULE, RDS_MODULE
+
+    offline_modules("target-ecs-module", ECS_MODULE, branch="move-ssm-params")
+    offline_modules("target-resource-module", RDS_MODULE)
+    offline_modules("target-elasticache-module", RDS_MODULE)
+    return offline_modules
+
+
+def generate(config_path, out_dir, formatter, monkeypatch):
+    with open(config_path) as f:
+        config = json.load(f)
+    # generated for real with each formatter, not served from the result cache
+    config.update(
+        {"remote_state": "local", "aws_account_id": "123456789012", "cache": False}
+    )
+    monkeypatch.setattr(settings, "HCL_FORMATTER", formatter)
+    return unzip(generate_terraform_project(out_dir, "tf_templates/", config))
+
+
+class TestConformance:
+    @pytest.mark.parametrize("config_path", TEST_CONFIGS, ids=os.path.basename)
+    def test_python_formatter_handles_test_configs(
+        self, test_config_modules, config_path, tmp_path, monkeypatch
+    ):
+        def no_fallback(path=".", recursive=False):
+            raise AssertionError("fell back to terraform fmt")
+
+        monkeypatch.setattr(utils, "terraform_format", no_fallback)
+
+        files = generate(config_path, str(tmp_path / "out"), "python", monkeypatch)
+
+        assert "main.tf" in files
+
+    @pytest.mark.skipif(
+        shutil.which("terraform") is None, reason="terraform binary not installed"
+    )
+    @pytest.mark.parametrize("config_path", TEST_CONFIGS, ids=os.path.basename)
+    def test_matches_terraform_fmt(
+        self, test_config_modules, config_path, tmp_path, monkeypatch
+    ):
+        python = generate(config_path, str(tmp_path / "python"), "python", monkeypatch)
+        terraform = generate(
+            config_path, str(tmp_path / "terraform"), "terraform", monkeypatch
+        )
+
+        assert python == terraform
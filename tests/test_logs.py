@@ -0,0 +1,45 @@
+import contextvars
+import logging
+
+import logs
+
+
+class Expensive:
+    calls = 0
+
+    def __repr__(self):
+        Expensive.calls += 1
+        return "expensive"
+
+
+def record(level):
+    return logging.LogRecord("trowel.test", level, __file__, 1, "msg", (), None)
+
+
+class TestLogs:
+    def test_summaries_are_capped(self):
+        payload = {"options": "x" * 10000, "blocks": list(range(1000))}
+
+        assert len(str(logs.summarize(payload))) < 1000
+        text = str(logs.summarize(payload, 50))
+        assert text.startswith("{'blocks': [0, 1, 2")
+        assert text.endswith("more chars)")
+
+    def test_debug_arguments_are_not_formatted(self):
+        logs.configure("INFO", 0)
+        Expensive.calls = 0
+
+        logs.get_logger("test").debug("options: %s", logs.summarize(Expensive()))
+
+        assert Expensive.calls == 0
+
+    def test_sampled_requests_log_debug(self):
+        debug_filter = logs.SampledDebugFilter(logging.INFO)
+
+        def run(sample_rate):
+            logs.start_request(sample_rate)
+            return debug_filter.filter(record(logging.DEBUG))
+
+        assert contextvars.copy_context().run(run, 1.0)
+        assert not contextvars.copy_context().run(run, 0.0)
+        assert debug_filter.filter(record(logging.WARNING))
@@ -0,0 +1,143 @@
+import copy
+import os
+
+import pytest
+
+import module_cache
+from exceptions import GitHubError, RefNotFoundError
+from mirrors import MirrorPool, enable_mirrors
+from module_cache import ModuleCache
+from utils import generate_terraform_project
+
+from .conftest import git
+from .test_generate import unzip
+
+
+@pytest.fixture
+def ls_remote_calls(monkeypatch):
+    calls = []
+    resolve_ref = module_cache.resolve_ref
+
+    def counting_resolve_ref(url, ref):
+        calls.append((url, ref))
+        return resolve_ref(url, ref)
+
+    monkeypatch.setattr(module_cache, "resolve_ref", counting_resolve_ref)
+    return calls
+
+
+class TestRefCache:
+    def test_ref_is_resolved_once_within_ttl(
+        self, tmp_path, module_repos, ls_remote_calls
+    ):
+        url = module_repos("target-ecs-module", {"main.tf": ""})
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=60, negative_ttl=60)
+
+        sha = pool.resolve(url, "main")
+        module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+
+        assert pool.resolve(url, "main") == sha
+        assert len(ls_remote_calls) == 1
+        assert pool.stats() == {"ref_hits": 1, "ref_misses": 1}
+
+    def test_ref_is_resolved_again_after_ttl(
+        self, tmp_path, module_repos, ls_remote_calls
+    ):
+        url = module_repos("target-ecs-module", {"main.tf": ""})
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=0, negative_ttl=0)
+
+        sha = pool.resolve(url, "main")
+        module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+
+        assert pool.resolve(url, "main") != sha
+        assert len(ls_remote_calls) == 2
+
+    def test_missing_ref_is_cached(self, tmp_path, module_repos, ls_remote_calls):
+        url = module_repos("target-ecs-module", {"main.tf": ""})
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=60, negative_ttl=60)
+
+        for _ in range(2):
+            with pytest.raises(RefNotFoundError):
+                pool.resolve(url, "does-not-exist")
+        assert len(ls_remote_calls) == 1
+
+    def test_failures_are_not_cached(self, tmp_path, ls_remote_calls):
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=60, negative_ttl=60)
+
+        for _ in range(2):
+            with pytest.raises(GitHubError):
+                pool.resolve(str(tmp_path / "not-a-repo"), "main")
+        assert len(ls_remote_calls) == 2
+
+
+class TestMirrorPool:
+    def test_export(self, tmp_path, module_repos):
+        url = module_repos(
+            "target-ecs-module",
+            {"main.tf": "a = 1\n", "svc.template.tf": "{{ a }}\n", "README.md": ""},
+        )
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=0, negative_ttl=0)
+        cache = ModuleCache(str(tmp_path / "cache"), 1024**3, mirrors=pool)
+
+        sha, files = cache.read(url, "main")
+        module_repos("target-ecs-module", {"main.tf": "a = 2\n"})
+        new_sha, new_files = cache.read(url, "main")
+
+        assert sorted(files) == ["main.tf", "svc.template.tf"]
+        assert files["main.tf"] == b"a = 1\n"
+        assert new_sha != sha
+        assert new_files["main.tf"] == b"a = 2\n"
+        # one mirror, fetched incrementally
+        assert len(os.listdir(tmp_path / "mirrors")) == 1
+
+    def test_commit_no_ref_points_to(self, tmp_path, module_repos):
+        url = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        git(url, "config", "uploadpack.allowAnySHA1InWant", "true")
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=0, negative_ttl=0)
+        pool.export(url, pool.resolve(url, "main"), str(tmp_path))
+        module_repos("target-ecs-module", {"main.tf": "a = 2\n"})
+        sha = pool.resolve(url, "main")
+        # force pushed away before the mirror fetched it
+        git(url, "reset", "-q", "--hard", "HEAD~1")
+        dest = tmp_path / "dest"
+        dest.mkdir()
+
+        pool.export(url, sha, str(dest))
+
+        assert (dest / "main.tf").read_text() == "a = 2\n"
+
+    def test_partial_mirror_fetches_module_files_only(self, tmp_path, module_repos):
+        path = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        git(path, "config", "uploadpack.allowFilter", "true")
+        git(path, "config", "uploadpack.allowAnySHA1InWant", "true")
+        module_repos("target-ecs-module", {"docs.md": os.urandom(256 * 1024).hex()})
+        url = f"file://{path}"
+        pool = MirrorPool(str(tmp_path / "mirrors"), ref_ttl=0, negative_ttl=0)
+        dest = tmp_path / "dest"
+        dest.mkdir()
+
+        fetched = pool.export(url, pool.resolve(url, "main"), str(dest))
+
+        assert os.listdir(dest) == ["main.tf"]
+        assert fetched < 64 * 1024
+
+    def test_unchanged_branch_costs_a_ref_lookup(
+        self, offline_modules, payload, ls_remote_calls
+    ):
+        pool = enable_mirrors(module_cache.MODULE_CACHE)
+        pool.ref_ttl = 60
+        payload["blocks"] = payload["blocks"][:3]
+        payload["cache"] = False
+
+        first = unzip(
+            generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        )
+        calls = len(ls_remote_calls)
+        second = unzip(
+            generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        )
+
+        assert second == first
+        assert calls == 2
+        assert len(ls_remote_calls) == calls
+        assert module_cache.MODULE_CACHE.stats()["misses"] == 2
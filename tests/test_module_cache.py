@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from exceptions import GitHubError
+from module_cache import ModuleCache, fetch_module
+
+from .conftest import git
+
+
+class TestModuleCache:
+    def test_second_read_is_a_hit(self, tmp_path, module_repos):
+        url = module_repos("target-ecs-module", {"main.template.tf": "a = 1\n"})
+        cache = ModuleCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+
+        sha, _ = cache.read(url, "main")
+        second_sha, files = cache.read(url, "main")
+
+        assert second_sha == sha
+        stats = cache.stats()
+        assert stats.pop("fetched_bytes") > 0
+        assert stats == {"hits": 1, "misses": 1, "evictions": 0, "stale": 0}
+        assert files == {"main.template.tf": b"a = 1\n"}
+
+    def test_new_commit_is_a_miss(self, tmp_path, module_repos):
+        url = module_repos("target-ecs-module", {"main.template.tf": "a = 1\n"})
+        cache = ModuleCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+
+        first_sha, _ = cache.read(url, "main")
+        module_repos("target-ecs-module", {"main.template.tf": "a = 2\n"})
+        second_sha, files = cache.read(url, "main")
+
+        assert first_sha != second_sha
+        assert cache.stats()["misses"] == 2
+        assert files["main.template.tf"] == b"a = 2\n"
+
+    def test_least_recently_used_entry_is_evicted(self, tmp_path, module_repos):
+        first = module_repos("first-module", {"main.tf": "a" * 1024})
+        second = module_repos("second-module", {"main.tf": "b" * 1024})
+        cache = ModuleCache(str(tmp_path / "cache"), max_bytes=1500)
+
+        cache.read(first, "main")
+        cache.read(second, "main")
+
+        assert cache.stats()["evictions"] == 1
+        assert len(os.listdir(tmp_path / "cache")) == 1
+        cache.read(second, "main")
+        assert cache.stats()["hits"] == 1
+
+    def test_missing_branch(self, tmp_path, module_repos):
+        url = module_repos("target-ecs-module", {"main.tf": ""})
+        cache = ModuleCache(str(tmp_path / "cache"), max_bytes=1024)
+
+        with pytest.raises(GitHubError):
+            cache.read(url, "does-not-exist")
+
+
+class TestFetchModule:
+    def test_only_files_the_generator_reads(self, tmp_path, module_repos):
+        url = module_repos(
+            "target-ecs-module",
+            {
+                "main.tf": "a = 1\n",
+                "service.template.tf": "b = {{ b }}\n",
+                "terraform.tfvars": "c = 1\n",
+                "README.md": "docs\n",
+            },
+        )
+        (tmp_path / "repos" / "target-ecs-module" / "examples").mkdir()
+        (tmp_path / "repos" / "target-ecs-module" / "examples" / "main.tf").write_text(
+            "d = 1\n"
+        )
+        module_repos("target-ecs-module", {})
+
+        fetch_module(url, "main", str(tmp_path / "dest"))
+
+        assert sorted(os.listdir(tmp_path / "dest")) == [
+            ".git",
+            "main.tf",
+            "service.template.tf",
+            "terraform.tfvars",
+        ]
+
+    def test_blobs_of_other_files_are_not_fetched(self, tmp_path, module_repos):
+        url = module_repos("target-ecs-module", {"main.tf": "a = 1\n"})
+        git(url, "config", "uploadpack.allowFilter", "true")
+        small = fetch_module(f"file://{url}", "main", str(tmp_path / "small"))
+        docs = os.urandom(256 * 1024).hex()
+        module_repos("target-ecs-module", {"docs.md": docs})
+
+        fetched = fetch_module(f"file://{url}", "main", str(tmp_path / "large"))
+
+        assert (tmp_path / "large" / "main.tf").exists()
+        assert fetched < small + 1024
@@ -0,0 +1,39 @@
+import pytest
+
+from output_tree import OutputTree
+
+
+class TestOutputTree:
+    def test_remove_dir(self):
+        tree = OutputTree()
+        tree.write("app/main.tf", "a = 1\n")
+        tree.write("app-db/main.tf", "b = 2\n")
+        tree.write("main.tf", "c = 3\n")
+
+        tree.remove_dir("app")
+
+        assert tree.paths() == ["app-db/main.tf", "main.tf"]
+
+    def test_paths_are_normalized(self):
+        tree = OutputTree()
+        tree.write("/app/./main.tf", b"a = 1\n")
+
+        assert tree.read("app/main.tf") == b"a = 1\n"
+        assert "app/main.tf" in tree
+        with pytest.raises(ValueError):
+            tree.write("../main.tf", "")
+
+    def test_dump_replaces_dest_dir(self, tmp_path):
+        (tmp_path / "out").mkdir()
+        (tmp_path / "out" / "stale.tf").write_text("")
+        tree = OutputTree()
+        tree.write("app/main.tf", "a = 1\n")
+        tree.write(".digger", "ENVIRONMENT_ID=1")
+
+        tree.dump(str(tmp_path / "out"))
+
+        assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+            ".digger",
+            "app",
+        ]
+        assert (tmp_path / "out" / "app" / "main.tf").read_text() == "a = 1\n"
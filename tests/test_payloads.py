@@ -2,7 +2,11 @@ import json
 import pytest
 from pydantic import ValidationError
 
-from payloads import PayloadGenerateTerraform
+from payloads import (
+    PayloadGenerateTerraform,
+    PayloadGenerateTerraformBatch,
+    batch_environments,
+)
 
 
 class TestPayloadGenerateTerraforms:
@@ -332,3 +336,52 @@ class TestPayloadGenerateTerraforms:
         }
 
         PayloadGenerateTerraform.parse_obj(payload)
+
+
+class TestPayloadGenerateTerraformBatch:
+    def test_needs_payloads_or_environments(self):
+        with pytest.raises(ValidationError):
+            PayloadGenerateTerraformBatch.parse_obj({})
+        with pytest.raises(ValidationError):
+            PayloadGenerateTerraformBatch.parse_obj(
+                {"payloads": [{}], "base": {}, "environments": {"dev": {}}}
+            )
+        assert PayloadGenerateTerraformBatch.parse_obj({"payloads": [{}]})
+
+    def test_environment_overrides(self):
+        base = {
+            "id": "env",
+            "aws_region": "us-east-1",
+            "blocks": [
+                {"name": "backend", "type": "container", "task_memory": 512},
+                {"name": "db", "type": "resource"},
+            ],
+        }
+        batch = {
+            "base": base,
+            "environments": {
+                "dev": {"namespace": "dev"},
+                "prod": {
+                    "aws_region": "eu-west-1",
+                    "blocks": [
+                        {"name": "backend", "task_memory": 2048},
+                        {"name": "cache", "type": "resource"},
+                    ],
+                },
+            },
+        }
+
+        (dev_name, dev), (prod_name, prod) = batch_environments(batch)
+
+        assert (dev_name, prod_name) == ("dev", "prod")
+        assert dev["namespace"] == "dev"
+        assert dev["blocks"] == base["blocks"]
+        assert prod["aws_region"] == "eu-west-1"
+        assert prod["blocks"][0] == {
+            "name": "backend",
+            "type": "container",
+            "task_memory": 2048,
+        }
+        assert [b["name"] for b in prod["blocks"]] == ["backend", "db", "cache"]
+        # base is left as it is
+        assert base["blocks"][0]["task_memory"] == 512
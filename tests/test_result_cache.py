@@ -0,0 +1,53 @@
+import result_cache
+from output_tree import OutputTree
+from result_cache import ResultCache, files_digest
+
+
+def make_tree(content="a = 1\n"):
+    tree = OutputTree()
+    tree.write("main.tf", content)
+    return tree
+
+
+class TestResultCache:
+    def test_entries_expire(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+        cache = ResultCache(max_bytes=1024, ttl=60)
+        tree = make_tree()
+        cache.put("key", tree)
+
+        now[0] += 59
+        assert cache.get("key") is tree
+        now[0] += 2
+        assert cache.get("key") is None
+        assert cache.stats() == {"hits": 1, "misses": 1}
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResultCache(max_bytes=20, ttl=60)
+        cache.put("a", make_tree("a" * 8))
+        cache.put("b", make_tree("b" * 8))
+        cache.get("a")
+
+        cache.put("c", make_tree("c" * 8))
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_zero_ttl_disables_cache(self):
+        cache = ResultCache(max_bytes=1024, ttl=0)
+        cache.put("key", make_tree())
+
+        assert cache.get("key") is None
+
+    def test_files_digest(self, tmp_path):
+        (tmp_path / "main.template.tf").write_text("a = 1\n")
+        (tmp_path / "notes.md").write_text("")
+        before = files_digest(str(tmp_path), r".*\.template\.")
+
+        (tmp_path / "notes.md").write_text("changed")
+        assert files_digest(str(tmp_path), r".*\.template\.") == before
+        (tmp_path / "main.template.tf").write_text("a = 2\n")
+        assert files_digest(str(tmp_path), r".*\.template\.") != before
+        assert files_digest(str(tmp_path / "missing")) is None
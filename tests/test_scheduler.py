@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+
+from exceptions import PayloadValidationException
+from scheduler import BlockTask, run_tasks
+from utils import block_dependencies
+
+
+def recording_tasks(names, log):
+    lock = threading.Lock()
+
+    def record(name):
+        with lock:
+            log.append(name)
+
+    return [BlockTask(name, f"/tmp/{name}", lambda n=name: record(n)) for name in names]
+
+
+class TestRunTasks:
+    def test_serial_respects_dependencies(self):
+        log = []
+        tasks = recording_tasks(["app", "db", "network"], log)
+
+        run_tasks(tasks, {"app": {"network", "db"}, "db": {"network"}})
+
+        assert log == ["network", "db", "app"]
+
+    def test_independent_tasks_keep_given_order(self):
+        log = []
+        tasks = recording_tasks(["queue", "bucket", "network"], log)
+
+        run_tasks(tasks, {})
+
+        assert log == ["queue", "bucket", "network"]
+
+    @pytest.mark.parametrize("max_workers", [1, 4])
+    def test_dependents_wait_for_their_inputs(self, max_workers):
+        log = []
+        tasks = recording_tasks([f"app-{i}" for i in range(8)] + ["network"], log)
+        dependencies = {f"app-{i}": {"network"} for i in range(8)}
+
+        run_tasks(tasks, dependencies, max_workers=max_workers)
+
+        assert log[0] == "network"
+        assert sorted(log[1:]) == sorted(f"app-{i}" for i in range(8))
+
+    def test_cycle_is_rejected_before_running_anything(self):
+        log = []
+        tasks = recording_tasks(["network", "app", "db"], log)
+
+        with pytest.raises(PayloadValidationException) as exinfo:
+            run_tasks(tasks, {"app": {"db"}, "db": {"app"}}, max_workers=4)
+
+        assert exinfo.value.message.endswith("app -> db -> app")
+        assert log == []
+
+    def test_failure_is_raised(self):
+        def fail():
+            raise ValueError("render failed")
+
+        with pytest.raises(ValueError):
+            run_tasks([BlockTask("app", "/tmp/app", fail)], max_workers=2)
+
+
+class TestBlockDependencies:
+    def config(self, *blocks):
+        return {
+            "blocks": [
+                {"name": "network", "type": "vpc"},
+                {"name": "redis", "type": "resource"},
+                *blocks,
+            ]
+        }
+
+    def test_references(self):
+        config = self.config(
+            {
+                "name": "app",
+                "type": "container",
+                "secret_mappings": ["REDIS_PASSWORD:redis.password"],
+                "environment_variables": [
+                    {"key": "REDIS", "value": "##module.redis.redis_url##"}
+                ],
+            },
+            {"name": "bucket", "type": "s3"},
+        )
+
+        assert block_dependencies(config, "network") == {
+            "network": set(),
+            "redis": {"network"},
+            "app": {"network", "redis"},
+            "bucket": set(),
+        }
+
+    def test_missing_reference(self):
+        config = self.config(
+            {
+                "name": "app",
+                "type": "container",
+                "environment_variables": [
+                    {"key": "CACHE", "value": "##module.memcached.url##"}
+                ],
+            },
+        )
+
+        with pytest.raises(PayloadValidationException) as exinfo:
+            block_dependencies(config, "network")
+
+        assert "'memcached'" in exinfo.value.message
+
+    def test_missing_network(self):
+        config = {"blocks": [{"name": "app", "type": "container"}]}
+
+        with pytest.raises(PayloadValidationException):
+            block_dependencies(config, None)
@@ -0,0 +1,125 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import handler
+import settings
+from server import GeneratorServer
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(workers=2, queue_size=2):
+        server = GeneratorServer(("127.0.0.1", 0), workers, queue_size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def request(address, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*address, timeout=10)
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response, data
+
+
+class TestServer:
+    def test_health(self, server):
+        response, data = request(server(), "GET", "/health")
+
+        assert response.status == 200
+        assert json.loads(data) == {"status": "ok"}
+
+    def test_invalid_payload(self, server):
+        response, data = request(server(), "POST", "/", body=json.dumps({}))
+
+        assert response.status == 500
+        assert "blocks" in json.loads(data)["error"]
+
+    @pytest.mark.parametrize("path", ["/", "/batch"])
+    def test_malformed_body(self, server, path):
+        address = server()
+
+        for body in ("{not json", "[]"):
+            response, data = request(address, "POST", path, body=body)
+
+            assert response.status == 400
+            assert "JSON" in json.loads(data)["error"]
+
+    def test_malformed_content_length(self, server):
+        response, data = request(
+            server(), "POST", "/", body="{}", headers={"Content-Length": "two"}
+        )
+
+        assert response.status == 400
+        assert json.loads(data) == {"error": "Invalid Content-Length"}
+
+    def test_generate_terraform(self, server, offline_modules, payload, monkeypatch):
+        monkeypatch.setattr(settings, "TF_TEMPLATES_DIR", "tf_templates/")
+        address = server()
+
+        response, data = request(address, "POST", "/", body=json.dumps(payload))
+        result = json.loads(data)
+        etag = response.getheader("ETag")
+
+        assert response.status == 200
+        assert result["body"]
+        assert result["headers"]["ETag"] == etag
+
+        response, data = request(
+            address,
+            "POST",
+            "/",
+            body=json.dumps(payload),
+            headers={"If-None-Match": etag},
+        )
+
+        assert response.status == 304
+        assert data == b""
+
+    def test_batch(self, server, offline_modules, payload, monkeypatch):
+        monkeypatch.setattr(settings, "TF_TEMPLATES_DIR", "tf_templates/")
+        batch = {
+            "base": payload,
+            "environments": {"dev": {"namespace": "dev"}, "qa": {"namespace": "qa"}},
+        }
+
+        response, data = request(server(), "POST", "/batch", body=json.dumps(batch))
+        result = json.loads(data)
+
+        assert response.status == 200
+        assert [e["name"] for e in result["environments"]] == ["dev", "qa"]
+        assert all(e["body"] for e in result["environments"])
+
+    def test_busy_server_rejects_requests(self, server, monkeypatch):
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate_terraform(event, context):
+            started.set()
+            release.wait(10)
+            return {"statusCode": 200, "body": ""}
+
+        monkeypatch.setattr(handler, "generate_terraform", generate_terraform)
+        address = server(workers=1, queue_size=0)
+        first = threading.Thread(target=request, args=(address, "POST", "/", "{}"))
+        first.start()
+        started.wait(10)
+
+        try:
+            response, _ = request(address, "POST", "/", body="{}")
+            assert response.status == 503
+        finally:
+            release.set()
+            first.join()
@@ -0,0 +1,58 @@
+import pytest
+
+from jinja2.exceptions import SecurityError
+
+from templating import TemplateCache
+
+
+class TestTemplateCache:
+    def test_same_content_is_compiled_once(self, tmp_path):
+        for d in ("first", "second"):
+            (tmp_path / d).mkdir()
+            (tmp_path / d / "main.template.tf").write_text(
+                'name = "{{ name | dashify }}"'
+            )
+        cache = TemplateCache()
+
+        first = cache.get_template(str(tmp_path / "first" / "main.template.tf"))
+        second = cache.get_template(str(tmp_path / "second" / "main.template.tf"))
+
+        assert first is second
+        assert cache.stats() == {"hits": 1, "misses": 1}
+        assert first.render(name="core_service") == 'name = "core-service"'
+
+    def test_changed_content_is_recompiled(self, tmp_path):
+        template_file = tmp_path / "main.template.tf"
+        cache = TemplateCache()
+
+        template_file.write_text("{{ name | underscorify }}")
+        assert cache.get_template(str(template_file)).render(name="a-b") == "a_b"
+        template_file.write_text("{{ name }}")
+        assert cache.get_template(str(template_file)).render(name="a-b") == "a-b"
+        assert cache.stats()["misses"] == 2
+
+    def test_bytecode_is_reused_by_a_new_process(self, tmp_path, monkeypatch):
+        template_file = tmp_path / "main.template.tf"
+        template_file.write_text("{% for b in blocks %}{{ b }},{% endfor %}")
+        TemplateCache(str(tmp_path / "bytecode")).get_template(str(template_file))
+
+        cold_cache = TemplateCache(str(tmp_path / "bytecode"))
+
+        def compile(*args, **kwargs):
+            pytest.fail("template should be loaded from bytecode cache")
+
+        monkeypatch.setattr(cold_cache.environment, "compile", compile)
+        template = cold_cache.get_template(str(template_file))
+        assert template.render(blocks=[1, 2]) == "1,2,"
+
+
+class TestSandbox:
+    def test_python_internals_are_not_reachable(self):
+        cache = TemplateCache()
+        template = cache.get_template(
+            "evil.template.tf",
+            source="{{ self.__init__.__globals__.__builtins__ }}",
+        )
+
+        with pytest.raises(SecurityError):
+            template.render()
@@ -0,0 +1,40 @@
+import threading
+
+from timing import Timings
+
+
+class TestTimings:
+    def test_spans_are_summed_by_stage(self):
+        timings = Timings()
+        for _ in range(3):
+            with timings.span("checkout"):
+                pass
+        timings.count("render_cache_hits", 2)
+
+        summary = timings.summary()
+
+        assert summary["stages"]["checkout"]["count"] == 3
+        assert summary["counters"] == {"render_cache_hits": 2}
+        assert summary["total_ms"] >= summary["stages"]["checkout"]["ms"]
+
+    def test_block_breakdown(self):
+        timings = Timings()
+
+        def process(name):
+            with timings.block(name):
+                with timings.span("checkout"):
+                    pass
+
+        threads = [threading.Thread(target=process, args=(n,)) for n in "ab"]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with timings.span("format"):
+            pass
+
+        summary = timings.summary()
+        assert set(summary["blocks"]) == {"a", "b"}
+        assert set(summary["blocks"]["a"]) == {"block", "checkout"}
+        assert summary["stages"]["block"]["count"] == 2
+        assert summary["stages"]["format"]["count"] == 1
@@ -0,0 +1,109 @@
+import copy
+import json
+import os
+
+import pytest
+
+import module_cache
+import settings
+import sources
+from exceptions import GitHubError, PayloadValidationException
+from sources import GitSource, VendoredSource, module_source
+from utils import generate_terraform_project
+from vendor_modules import main, vendor_modules
+
+from .conftest import ECS_MODULE
+from .test_generate import unzip
+
+
+@pytest.fixture
+def vendored(offline_modules, monkeypatch, tmp_path):
+    """
+    vendors the ecs, network and rds modules and points settings.VENDOR_DIR at them
+    """
+    vendor_dir = str(tmp_path / "vendor")
+    vendor_modules(
+        [
+            "diggerhq/target-network-module@main",
+            "diggerhq/target-ecs-module@dev",
+            "diggerhq/target-rds-module@dev",
+        ],
+        vendor_dir,
+    )
+    monkeypatch.setattr(settings, "VENDOR_DIR", vendor_dir)
+    monkeypatch.setattr(sources, "_snapshots", {})
+    return vendor_dir
+
+
+class TestVendorModules:
+    def test_snapshot(self, vendored):
+        with open(os.path.join(vendored, "manifest.json")) as fp:
+            modules = json.load(fp)["modules"]
+
+        entry = modules[f"{settings.MODULE_BASE_URL}/target-ecs-module@dev"]
+        assert entry["target"] == "diggerhq/target-ecs-module@dev"
+        assert entry["sha"] == module_cache.resolve_ref(entry["url"], "dev")
+        entry_dir = os.path.join(vendored, entry["path"])
+        assert set(os.listdir(entry_dir)) == set(ECS_MODULE) - {"README.md"}
+        assert not os.stat(os.path.join(entry_dir, "variables.tf")).st_mode & 0o222
+
+    def test_only_git_targets(self, tmp_path):
+        with pytest.raises(PayloadValidationException):
+            vendor_modules([f"dir://{tmp_path}"], str(tmp_path / "vendor"))
+
+    def test_cli(self, offline_modules, tmp_path):
+        targets = tmp_path / "modules.vendor.json"
+        targets.write_text(json.dumps(["diggerhq/target-ecs-module@dev"]))
+        vendor_dir = str(tmp_path / "vendor")
+
+        assert main(["vendor_modules.py", str(targets), vendor_dir]) == 0
+        assert os.path.isfile(os.path.join(vendor_dir, "manifest.json"))
+        # the snapshot is immutable
+        with pytest.raises(FileExistsError):
+            main(["vendor_modules.py", str(targets), vendor_dir])
+
+
+class TestVendoredSource:
+    def test_module_source(self, vendored):
+        source = module_source("target-ecs-module", "dev")
+
+        assert isinstance(source, VendoredSource)
+        assert source.key == GitSource(source.url, "dev").key
+        assert isinstance(module_source("target-ecs-module", "other"), GitSource)
+        assert isinstance(
+            module_source("target-ecs-module", "dev", vendored=False), GitSource
+        )
+
+    def test_generate_without_network(self, vendored, payload, monkeypatch):
+        def no_network(*args, **kwargs):
+            raise GitHubError("network used")
+
+        monkeypatch.setattr(module_cache, "resolve_ref", no_network)
+        monkeypatch.setattr(module_cache, "clone_repo", no_network)
+
+        files = unzip(
+            generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        )
+
+        assert b'name    = "backend"' in files["backend/service.tf"]
+
+    def test_refs_not_vendored_are_fetched(self, vendored, offline_modules, payload):
+        offline_modules(
+            "target-ecs-module",
+            {**ECS_MODULE, "variables.tf": 'variable "from_main" {}\n'},
+            branch="main",
+        )
+        payload["blocks"][1]["target"] = "diggerhq/target-ecs-module@main"
+
+        files = unzip(
+            generate_terraform_project(None, "tf_templates/", copy.deepcopy(payload))
+        )
+
+        assert b"from_main" in files["backend/variables.tf"]
+        assert b"from_main" not in files["worker/variables.tf"]
+
+    def test_missing_manifest(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, "VENDOR_DIR", str(tmp_path))
+        monkeypatch.setattr(sources, "_snapshots", {})
+
+        assert isinstance(module_source("target-ecs-module", "dev"), GitSource)
@@ -0,0 +1,77 @@
+"""
+Where the time of a request goes.
+
+Stages (validation, clones, renders, formatting, archiving...) are timed with
+spans and summed up by stage name. Spans opened while a block is being processed
+are also added to that block's breakdown, blocks run on worker threads so the
+current block is tracked per thread.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = defaultdict(lambda: {"count": 0, "ms": 0.0})
+        self.blocks = defaultdict(lambda: defaultdict(float))
+        self.counters = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        """
+        times the body of the with statement as stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def block(self, name):
+        """
+        times processing of block name, spans inside go to its breakdown as well
+        """
+        self._local.block = name
+        try:
+            with self.span("block"):
+                yield
+        finally:
+            self._local.block = None
+
+    def record(self, stage, seconds):
+        ms = seconds * 1000
+        block = getattr(self._local, "block", None)
+        with self._lock:
+            self.stages[stage]["count"] += 1
+            self.stages[stage]["ms"] += ms
+            if block is not None:
+                self.blocks[block][stage] += ms
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def summary(self):
+        """
+        returns json serializable summary, times in milliseconds
+        """
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "stages": {
+                    stage: {"count": s["count"], "ms": round(s["ms"], 1)}
+                    for stage, s in self.stages.items()
+                },
+                "blocks": {
+                    block: {stage: round(ms, 1) for stage, ms in stages.items()}
+                    for block, stages in self.blocks.items()
+                },
+                "counters": dict(self.counters),
+            }
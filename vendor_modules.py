@@ -0,0 +1,101 @@
+"""
+Builds the vendored module snapshot baked into the image.
+
+    python vendor_modules.py modules.vendor.json <dest_dir>
+
+modules.vendor.json lists module targets in payload syntax (diggerhq/<name>@<ref>
+or git+<url>@<ref>). Each one is fetched once, at build time, into
+<dest_dir>/<entry>/ and recorded in <dest_dir>/manifest.json with the commit its
+ref pointed to. At runtime settings.VENDOR_DIR points at <dest_dir> and sources
+reads those targets from the snapshot, other targets are still fetched.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import sys
+import tempfile
+
+from exceptions import PayloadValidationException
+from logs import get_logger
+from module_cache import ModuleCache
+from sources import GitSource, module_source, parse_target, vendored_key
+
+logger = get_logger(__name__)
+
+READ_ONLY_FILE = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+READ_ONLY_DIR = READ_ONLY_FILE | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+
+
+def vendor_modules(targets, dest_dir):
+    """
+    fetches targets into dest_dir and writes its manifest
+    :param targets: module targets in payload syntax
+    :param dest_dir: snapshot directory, must not contain another snapshot
+    :return: manifest
+    """
+    if os.path.exists(os.path.join(dest_dir, "manifest.json")):
+        raise FileExistsError(f"{dest_dir} already contains a snapshot")
+    os.makedirs(dest_dir, exist_ok=True)
+
+    modules = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ModuleCache(cache_dir, sys.maxsize)
+        for target in targets:
+            source = module_source(*parse_target(target), vendored=False)
+            if not isinstance(source, GitSource):
+                raise PayloadValidationException(
+                    f"Target {target} is not a git repo, only git repos are vendored"
+                )
+            key = vendored_key(source.url, source.ref)
+            if key in modules:
+                continue
+
+            sha, files = source.read(cache=cache)
+            url_hash = hashlib.sha256(source.url.encode()).hexdigest()[:16]
+            entry = f"{url_hash}-{sha}"
+            write_entry(os.path.join(dest_dir, entry), files)
+            modules[key] = {
+                "target": target,
+                "url": source.url,
+                "ref": source.ref,
+                "sha": sha,
+                "path": entry,
+            }
+            logger.info("vendored %s at %s", target, sha)
+
+    manifest = {"modules": modules}
+    with open(os.path.join(dest_dir, "manifest.json"), "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    return manifest
+
+
+def write_entry(entry_dir, files):
+    """
+    writes files into entry_dir and makes it read only, the snapshot is immutable
+    """
+    if os.path.isdir(entry_dir):
+        return
+    os.makedirs(entry_dir)
+    for name, content in files.items():
+        path = os.path.join(entry_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        os.chmod(path, READ_ONLY_FILE)
+    os.chmod(entry_dir, READ_ONLY_DIR)
+
+
+def main(argv):
+    if len(argv) != 3:
+        print(f"usage: {argv[0]} <modules.vendor.json> <dest_dir>", file=sys.stderr)
+        return 2
+    with open(argv[1]) as fp:
+        targets = json.load(fp)
+    manifest = vendor_modules(targets, argv[2])
+    logger.info("vendored %s modules into %s", len(manifest["modules"]), argv[2])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))